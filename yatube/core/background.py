@@ -0,0 +1,51 @@
+"""Пул фоновых потоков для работы, которую не должен ждать запрос.
+
+Задача ставится после коммита текущей транзакции, чтобы воркер видел
+сохранённые данные. С ``BACKGROUND_TASKS_SYNC = True`` задачи выполняются
+сразу в вызывающем потоке (удобно для тестов и management-команд).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='yatube-background',
+            )
+    return _executor
+
+
+def _call(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', func)
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        _call(func, args, kwargs)
+    finally:
+        connection.close()
+
+
+def submit(func, *args, **kwargs):
+    if settings.BACKGROUND_TASKS_SYNC:
+        _call(func, args, kwargs)
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, args, kwargs))
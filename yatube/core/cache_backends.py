@@ -0,0 +1,261 @@
+"""Бэкенды кэша с метриками попаданий и общий для процессов SQLite-кэш.
+
+Какой бэкенд используется, выбирается переменной окружения
+``YATUBE_CACHE`` (см. ``CACHES`` в ``yatube/settings.py``).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.core.cache.backends import filebased, locmem, memcached
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+try:
+    from django_redis.cache import RedisCache as _RedisCache
+except ImportError:
+    _RedisCache = None
+
+_MISSING = object()
+_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+def stats():
+    """Попадания и промахи по бэкендам в текущем процессе."""
+    with _stats_lock:
+        return {name: dict(counter) for name, counter in _stats.items()}
+
+
+class StatsMixin:
+    # Бэкенды с собственным get_many считают его сами; у остальных
+    # BaseCache.get_many вызывает get, и счёт идёт там.
+    native_get_many = False
+
+    @property
+    def stats_name(self):
+        return type(self).__name__
+
+    def _record(self, hits, misses):
+        with _stats_lock:
+            counter = _stats[self.stats_name]
+            counter['hits'] += hits
+            counter['misses'] += misses
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._record(0, 1)
+            return default
+        self._record(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        result = super().get_many(keys, version=version)
+        if self.native_get_many:
+            self._record(len(result), len(keys) - len(result))
+        return result
+
+
+class LocMemCache(StatsMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(StatsMixin, filebased.FileBasedCache):
+    pass
+
+
+class MemcachedCache(StatsMixin, memcached.MemcachedCache):
+    native_get_many = True
+
+
+if _RedisCache is not None:
+    class RedisCache(StatsMixin, _RedisCache):
+        native_get_many = True
+
+
+class SQLiteCache(StatsMixin, BaseCache):
+    """Кэш в отдельном файле SQLite, общий для всех воркеров хоста.
+
+    Не требует сервера: процессы видят одни и те же записи через файл,
+    WAL позволяет читать параллельно с записью.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    # Переполнение проверяется не на каждой записи: COUNT(*) не бесплатен.
+    cull_every = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.connection = connection
+        return connection
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _fresh(self):
+        return '(expires IS NULL OR expires > ?)', time.time()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE берёт блокировку записи до чтения, а при ошибке
+        # откатываем всё: частично сделанная запись не фиксируется.
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _write(self, sql, key, value, timeout):
+        self._db.execute(sql, (
+            key, self._dumps(value), self.get_backend_timeout(timeout)))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._cull()
+        with self._transaction() as db:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()))
+            self._write(
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?)',
+                key, value, timeout)
+            added = db.execute('SELECT changes()').fetchone()[0] == 1
+        return added
+
+    def get(self, key, default=None, version=None):
+        result = self.get_many([key], version=version)
+        return result.get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        key_map = {self.make_key(key, version=version): key for key in keys}
+        condition, now = self._fresh()
+        placeholders = ', '.join('?' * len(key_map))
+        rows = self._db.execute(
+            f'SELECT key, value FROM cache '
+            f'WHERE key IN ({placeholders}) AND {condition}',
+            (*key_map, now),
+        )
+        result = {key_map[key]: pickle.loads(value) for key, value in rows}
+        self._record(len(result), len(keys) - len(result))
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._cull()
+        self._write(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+            key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append((key, self._dumps(value), expires))
+        self._cull()
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)', rows)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        condition, now = self._fresh()
+        cursor = self._db.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {condition}',
+            (self.get_backend_timeout(timeout), key, now),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        condition, now = self._fresh()
+        # Блокировка записи до чтения: инкремент атомарен между процессами.
+        with self._transaction() as db:
+            row = db.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {condition}',
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dumps(value), key))
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        condition, now = self._fresh()
+        row = self._db.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {condition}',
+            (key, now),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self):
+        writes = getattr(self._local, 'writes', 0) + 1
+        self._local.writes = writes
+        if writes % self.cull_every:
+            return
+        db = self._db
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count < self._max_entries:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count >= self._max_entries and self._cull_frequency:
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def close(self, **kwargs):
+        # Соединение живёт в потоке и переиспользуется между запросами.
+        pass
@@ -0,0 +1,151 @@
+"""Соединения с базой: настройка SQLite, чтение лент с реплик и
+«читай свои записи» после записи.
+
+Каждое новое соединение SQLite получает ``SQLITE_PRAGMAS`` из настроек
+(сигнал ``connection_created``, см. ``core.apps``): WAL позволяет читать
+во время записи, а ``busy_timeout`` заставляет писателей ждать блокировку
+вместо ``database is locked``.
+
+Представления, помеченные ``@replica_reads``, читают модели из
+``REPLICA_APPS`` со случайной реплики из ``DATABASE_REPLICAS``; сессии,
+пользователи, всё остальное и любые записи идут в ``default``.
+Если за запрос была хоть одна запись, ``ReplicaMiddleware`` ставит
+клиенту cookie на ``REPLICA_PIN_SECONDS``: пока она жива, его запросы
+читают из ``default`` и видят свои изменения, даже если реплика отстаёт.
+Предполагается, что реплики догоняют default за это же окно.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+
+PIN_COOKIE = 'yatube_primary'
+
+_state = threading.local()
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def write_transaction():
+    """``atomic()``, который на SQLite сразу берёт блокировку записи.
+
+    BEGIN в SQLite откладывает её до первой записи; если транзакция до
+    этого успела читать, а другой процесс — записать, SQLite отвечает
+    ``database is locked`` сразу, не дожидаясь ``busy_timeout``.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                # Пустая запись в любую таблицу ждёт блокировку как INSERT.
+                cursor.execute(
+                    'UPDATE django_migrations SET id = id WHERE 0')
+        yield
+
+
+def estimated_rows(model, using='default'):
+    """Число строк таблицы по статистике планировщика или None.
+
+    Статистика есть у PostgreSQL и MySQL; для прочих СУБД и таблиц, ещё
+    не прошедших ANALYZE, оценки нет.
+    """
+    vendor = connections[using].vendor
+    if vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    elif vendor == 'mysql':
+        sql = (
+            'SELECT table_rows FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name = %s'
+        )
+    else:
+        return None
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    # До первого ANALYZE PostgreSQL хранит -1 (или 0 в старых версиях).
+    if row and row[0] and row[0] > 0:
+        return int(row[0])
+    return None
+
+
+def pin():
+    """Отмечает запись в текущем запросе: клиент будет читать из default."""
+    _state.wrote = True
+
+
+def on_replica():
+    return getattr(_state, 'replica', None) is not None
+
+
+def cache_timeout(timeout):
+    """Срок кэша для данных, прочитанных в текущем запросе.
+
+    Данные с реплики могут отставать от версии кэша, под которой их
+    сохранят, поэтому живут не дольше окна «читай свои записи».
+    """
+    if on_replica():
+        return min(timeout, settings.REPLICA_PIN_SECONDS)
+    return timeout
+
+
+def replica_reads(view):
+    """Помечает представление, которому достаточно чтения с реплики."""
+    view.replica_reads = True
+    return view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in settings.REPLICA_APPS:
+            return 'default'
+        return getattr(_state, 'replica', None)
+
+    def db_for_write(self, model, **hints):
+        pin()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default: объекты из разных баз связаны.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приходит вместе с данными из default.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        _state.replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if _state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            getattr(view_func, 'replica_reads', False)
+            and settings.DATABASE_REPLICAS
+            and PIN_COOKIE not in request.COOKIES
+        ):
+            _state.replica = random.choice(settings.DATABASE_REPLICAS)
@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует SQLite-базу default в реплики из YATUBE_DB_REPLICAS '
+        '(локальная замена репликации)'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_DB_REPLICAS')
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError(
+                'Реплики PostgreSQL обновляет потоковая репликация сервера')
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                connections[alias].close()
+                target = sqlite3.connect(
+                    connections[alias].settings_dict['NAME'])
+                try:
+                    # Онлайн-копия: писатели default не блокируются надолго.
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(self.style.SUCCESS(f'{alias}: обновлена'))
+        finally:
+            source.close()
@@ -1,5 +1,17 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+
+from core import db
+from core.cache_backends import SQLiteCache, stats
+from posts.models import Post
 
 User = get_user_model()
 
@@ -13,3 +25,124 @@ class ViewTestClass(TestCase):
         response = self.client.get('page')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache = SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), {})
+        # Второй экземпляр — как другой воркер с тем же файлом.
+        self.other = SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), {})
+
+    def test_values_are_shared(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.other.get('key'), {'value': 1})
+        self.assertFalse(self.other.add('key', 2))
+        self.assertTrue(self.other.add('new', 2))
+        self.assertEqual(
+            self.cache.get_many(['key', 'new', 'missing']),
+            {'key': {'value': 1}, 'new': 2},
+        )
+        self.other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_incr_and_expiry(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.other.incr('counter', 5), 6)
+        self.assertEqual(self.cache.get('counter'), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('expired', 1, timeout=-1)
+        self.assertFalse(self.cache.has_key('expired'))
+
+    def test_failed_write_is_rolled_back(self):
+        self.cache.set('expired', 1, timeout=-1)
+        with self.assertRaises(Exception):
+            # Лямбда не сериализуется: ошибка после DELETE внутри add.
+            self.cache.add('expired', lambda: None)
+        rows = self.other._db.execute(
+            'SELECT COUNT(*) FROM cache WHERE key LIKE ?', ('%expired',))
+        self.assertEqual(rows.fetchone()[0], 1)
+        self.assertTrue(self.cache.add('expired', 2))
+
+    def test_stats(self):
+        before = stats().get('SQLiteCache', {'hits': 0, 'misses': 0})
+        self.cache.set('key', 1)
+        self.cache.get('key')
+        self.cache.get('missing')
+        after = stats()['SQLiteCache']
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.seen = []
+
+    def request(self, view, method='get', **cookies):
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies)
+        middleware = db.ReplicaMiddleware(
+            lambda request: middleware.process_view(request, view, (), {})
+            or view(request))
+        return middleware(request)
+
+    def view(self, action):
+        def view(request):
+            self.seen.append(action())
+            return HttpResponse()
+        return view
+
+    def reading_view(self, model=Post):
+        return self.view(lambda: router.db_for_read(model))
+
+    def test_marked_views_read_from_replica(self):
+        self.request(db.replica_reads(self.reading_view()))
+        self.request(self.reading_view())
+        self.assertEqual(self.seen, ['replica1', 'default'])
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_sessions_and_users_stay_on_primary(self):
+        for model in (Session, User, ContentType):
+            self.request(db.replica_reads(self.reading_view(model)))
+        self.assertEqual(self.seen, ['default'] * 3)
+
+    def test_write_pins_client_to_primary(self):
+        response = self.request(
+            self.view(lambda: router.db_for_write(User)), method='post')
+        cookie = response.cookies[db.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        response = self.request(
+            db.replica_reads(self.reading_view()), **{db.PIN_COOKIE: '1'})
+        self.assertEqual(self.seen, ['default', 'default'])
+        self.assertNotIn(db.PIN_COOKIE, response.cookies)
+
+    def test_replica_data_cached_briefly(self):
+        self.request(db.replica_reads(
+            self.view(lambda: db.cache_timeout(300))))
+        self.request(self.view(lambda: db.cache_timeout(300)))
+        self.assertEqual(self.seen, [5, 300])
+
+
+class SQLiteTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_pragmas(self):
+        self.assertEqual(self.pragma('busy_timeout'), 20_000)
+        # 1 — NORMAL.
+        self.assertEqual(self.pragma('synchronous'), 1)
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1234})
+    def test_pragmas_come_from_settings(self):
+        default = self.pragma('cache_size')
+        db.configure_sqlite(None, connection)
+        self.addCleanup(
+            connection.cursor().execute, f'PRAGMA cache_size = {default}')
+        self.assertEqual(self.pragma('cache_size'), -1234)
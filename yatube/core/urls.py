@@ -0,0 +1,8 @@
+from django.urls import path
+from core import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+]
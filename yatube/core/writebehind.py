@@ -0,0 +1,305 @@
+"""Отложенная запись (write-behind) частых мелких изменений.
+
+С ``WRITE_BEHIND = True`` запрос только проверяет данные и ставит запись
+в очередь процесса. Фоновый поток ждёт ``WRITE_BEHIND_INTERVAL`` секунд,
+собирая пачку, а второй применяет накопленное одной транзакцией: один
+коммит на пачку вместо коммита на каждый запрос. Порядок записей
+сохраняется.
+
+Если задан каталог ``WRITE_BEHIND_JOURNAL``, пачка сначала дописывается
+в журнал процесса с ``fsync``, и только после этого запросы получают
+ответ (групповой коммит): подтверждённая запись переживает падение
+процесса. Журнал состоит из сегментов ``<pid>-<uuid>-<номер>.journal``:
+uuid отличает запуск процесса, чтобы новый процесс с тем же pid не
+дописал и не обрезал чужой журнал. Сегмент закрывается, дорастя до
+``WRITE_BEHIND_SEGMENT_SIZE``, и удаляется, когда всё в нём применено,
+поэтому журнал не растёт и под постоянной нагрузкой. Журналы
+завершившихся процессов проигрываются при старте потоков, поэтому
+обработчики должны переносить повтор уже применённой записи
+(см. ``register``).
+
+С ``BACKGROUND_TASKS_SYNC`` потоки не запускаются, и очередь
+применяет ``flush()`` (тесты, management-команды).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from core import db
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_lock = threading.Condition()
+_journal_lock = threading.Lock()
+_apply_lock = threading.Lock()
+_pending = []
+_ready = []
+_queued = 0
+_durable = 0
+_writer_pid = None
+# Текущий сегмент журнала, имя журнала процесса и номер сегмента.
+_journal = None
+_journal_owner = None
+_journal_seq = 0
+# Закрытые сегменты: (номер, путь), удаляются после применения.
+_closed = []
+
+
+def register(kind, apply, replay=None):
+    """Обработчик записей ``kind``; ``replay`` — для проигрыша журнала."""
+    _handlers[kind] = (apply, replay or apply)
+
+
+def enabled():
+    return settings.WRITE_BEHIND
+
+
+def submit(kind, *args):
+    """Ставит запись в очередь; с журналом ждёт, пока она попадёт на диск.
+
+    Аргументы должны сериализоваться в JSON.
+    """
+    global _queued
+    # Запись уже принята: клиент должен читать из default (см. core.db).
+    db.pin()
+    with _lock:
+        _start()
+        _pending.append((kind, args))
+        _queued += 1
+        number = _queued
+        _lock.notify_all()
+        if settings.WRITE_BEHIND_JOURNAL and _writer_pid == os.getpid():
+            if not _lock.wait_for(
+                    lambda: _durable >= number,
+                    settings.WRITE_BEHIND_TIMEOUT):
+                raise RuntimeError('Журнал отложенной записи не отвечает')
+
+
+def _start():
+    global _writer_pid
+    if settings.BACKGROUND_TASKS_SYNC or _writer_pid == os.getpid():
+        return
+    # После fork очереди родителя принадлежат не нам.
+    _pending.clear()
+    _ready.clear()
+    _writer_pid = os.getpid()
+    # Журнал и база — отдельные потоки: fsync следующей пачки и ответ
+    # запросам не ждут, пока применяется предыдущая.
+    for target in (_journal_loop, _apply_loop):
+        threading.Thread(
+            target=target, name='yatube-write-behind', daemon=True).start()
+    atexit.register(flush)
+
+
+def _journal_loop():
+    while True:
+        with _lock:
+            _lock.wait_for(lambda: _pending)
+        time.sleep(settings.WRITE_BEHIND_INTERVAL)
+        try:
+            _write_journal()
+        except Exception:
+            # Пачка не подтверждена: её запросы получат ошибку по таймауту.
+            logger.exception('Сбой журнала отложенной записи')
+
+
+def _apply_loop():
+    recover()
+    while True:
+        with _lock:
+            _lock.wait_for(lambda: _ready)
+        try:
+            _apply_ready()
+        except Exception:
+            logger.exception('Сбой отложенной записи')
+        finally:
+            close_old_connections()
+
+
+def _write_journal():
+    global _durable
+    with _journal_lock:
+        with _lock:
+            batch = _pending[:]
+            _pending.clear()
+            number = _queued
+        if not batch:
+            return
+        journal = _open_journal()
+        if journal is not None:
+            journal.write(''.join(
+                json.dumps([kind, args], ensure_ascii=False) + '\n'
+                for kind, args in batch))
+            journal.flush()
+            os.fsync(journal.fileno())
+        with _lock:
+            _ready.extend(batch)
+            _durable = number
+            # Под _lock вместе с _ready: всё из закрытых сегментов уже
+            # в очереди на применение.
+            if journal is not None and (
+                    journal.tell() >= settings.WRITE_BEHIND_SEGMENT_SIZE):
+                _rotate()
+            _lock.notify_all()
+
+
+def _apply_ready():
+    with _apply_lock:
+        with _lock:
+            batch = _ready[:]
+            _ready.clear()
+            applied_below = _journal_seq
+        if not batch:
+            return
+        _apply(batch)
+        with _journal_lock, _lock:
+            # Всё, что есть в журнале, уже в базе — его можно обрезать.
+            if not _ready and _journal is not None:
+                _journal.seek(0)
+                _journal.truncate()
+            while _closed and _closed[0][0] < applied_below:
+                _remove(_closed.pop(0)[1])
+
+
+def flush():
+    """Записывает очередь в журнал и применяет её одной транзакцией."""
+    _write_journal()
+    _apply_ready()
+
+
+def _apply(batch, replay=False):
+    try:
+        with db.write_transaction():
+            for kind, args in batch:
+                apply, replay_apply = _handlers[kind]
+                (replay_apply if replay else apply)(*args)
+    except Exception:
+        if len(batch) == 1:
+            logger.exception('Отложенная запись %r отброшена', batch[0])
+            return
+        # Одна негодная запись не губит пачку: применяем по одной.
+        # Счётчики в кэше при этом могут разойтись до истечения TTL.
+        for entry in batch:
+            _apply([entry], replay)
+
+
+def _owner():
+    global _journal, _journal_owner, _journal_seq
+    pid = os.getpid()
+    if _journal_owner is None or not _journal_owner.startswith(f'{pid}-'):
+        # Новый процесс (или потомок после fork) — новый журнал; файл
+        # родителя остаётся ему.
+        _journal_owner = f'{pid}-{uuid.uuid4().hex}'
+        _journal_seq = 0
+        _journal = None
+        _closed.clear()
+    return _journal_owner
+
+
+def _segment_path(owner, seq):
+    return os.path.join(
+        settings.WRITE_BEHIND_JOURNAL, f'{owner}-{seq}.journal')
+
+
+def _open_journal():
+    global _journal
+    if not settings.WRITE_BEHIND_JOURNAL:
+        return None
+    path = _segment_path(_owner(), _journal_seq)
+    if _journal is None or _journal.name != path:
+        os.makedirs(settings.WRITE_BEHIND_JOURNAL, exist_ok=True)
+        _journal = open(path, 'a', encoding='utf-8')
+        # Запись о новом файле в каталоге тоже должна пережить падение.
+        directory = os.open(settings.WRITE_BEHIND_JOURNAL, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+    return _journal
+
+
+def _rotate():
+    """Закрывает сегмент: следующие записи пойдут в новый."""
+    global _journal, _journal_seq
+    if _journal is None:
+        return
+    _journal.close()
+    _closed.append((_journal_seq, _journal.name))
+    _journal = None
+    _journal_seq += 1
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        # Каталог журналов сменили (тесты) вместе с содержимым.
+        pass
+
+
+def _alive(owner):
+    pid = int(owner.split('-', 1)[0])
+    if pid == os.getpid():
+        # Журнал прежнего процесса с тем же pid живым не считается.
+        return owner == _journal_owner
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _segments(directory):
+    """Сегменты журналов в каталоге: {имя журнала: [путь, ...]} по порядку."""
+    found = {}
+    for name in os.listdir(directory):
+        stem, extension = os.path.splitext(name)
+        parts = stem.split('-')
+        if (extension != '.journal' or len(parts) != 3
+                or not parts[0].isdigit() or not parts[2].isdigit()):
+            continue
+        owner = f'{parts[0]}-{parts[1]}'
+        found.setdefault(owner, []).append(
+            (int(parts[2]), os.path.join(directory, name)))
+    return {owner: [path for _, path in sorted(segments)]
+            for owner, segments in found.items()}
+
+
+def recover():
+    """Проигрывает журналы завершившихся процессов; вернёт число записей."""
+    directory = settings.WRITE_BEHIND_JOURNAL
+    if not directory or not os.path.isdir(directory):
+        return 0
+    replayed = 0
+    for owner in sorted(_segments(directory)):
+        if _alive(owner):
+            continue
+        claim = os.path.join(directory, f'{owner}.recovering')
+        try:
+            # Создание каталога атомарно: журнал достанется одному
+            # процессу целиком, и сегменты проиграются по порядку.
+            os.mkdir(claim)
+        except FileExistsError:
+            continue
+        # Список заново: пока мы выбирали, журнал мог забрать другой.
+        for path in _segments(directory).get(owner, ()):
+            with open(path, encoding='utf-8') as journal:
+                # Оборванная последняя строка не была подтверждена клиенту.
+                batch = [tuple(json.loads(line)) for line in journal
+                         if line.endswith('\n')]
+            if batch:
+                _apply(batch, replay=True)
+            os.remove(path)
+            replayed += len(batch)
+        os.rmdir(claim)
+    return replayed
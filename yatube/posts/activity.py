@@ -0,0 +1,77 @@
+"""Денормализованные ``comment_count`` и ``last_comment_at`` постов.
+
+Поля меняются одним ``UPDATE ... SET x = F(x) ± 1`` из сигналов
+``Comment``, поэтому конкурентные комментарии не теряют инкременты, а
+ленты показывают активность без запроса на каждый пост. Расхождения
+(массовые операции мимо сигналов, ручные правки БД) исправляет
+``reconcile`` — ``manage.py reconcile_comment_counts``.
+"""
+from django.db.models import (
+    Case, Count, DateTimeField, F, IntegerField, Max, OuterRef, Q, Subquery,
+    Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Post
+
+BATCH_SIZE = 1000
+
+
+def comment_added(comment):
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=F('comment_count') + 1,
+        last_comment_at=Case(
+            When(last_comment_at__gt=comment.created,
+                 then=F('last_comment_at')),
+            default=Value(comment.created),
+            output_field=DateTimeField(),
+        ),
+    )
+
+
+def _latest_comment():
+    return Subquery(
+        Comment.objects.filter(post=OuterRef('pk'))
+        .order_by('-created').values('created')[:1],
+        output_field=DateTimeField(),
+    )
+
+
+def _actual_count():
+    return Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk')).order_by()
+        .values('post').annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def comment_removed(comment):
+    Post.objects.filter(pk=comment.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1,
+        last_comment_at=_latest_comment(),
+    )
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    """Пересчитывает поля по диапазонам id; возвращает число исправленных."""
+    fixed = 0
+    last = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+    for start in range(0, last, batch_size):
+        wrong = Post.objects.filter(
+            pk__gt=start, pk__lte=start + batch_size,
+        ).annotate(
+            actual_count=_actual_count(),
+            actual_last=_latest_comment(),
+        ).exclude(
+            Q(comment_count=F('actual_count')) & (
+                Q(last_comment_at=F('actual_last'))
+                | Q(last_comment_at__isnull=True, actual_last__isnull=True)
+            )
+        ).values_list('pk', flat=True)
+        pks = list(wrong)
+        if pks:
+            fixed += Post.objects.filter(pk__in=pks).update(
+                comment_count=_actual_count(),
+                last_comment_at=_latest_comment(),
+            )
+    return fixed
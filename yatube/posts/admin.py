@@ -1,8 +1,144 @@
-from django.contrib import admin
-from posts.models import Post, Group, Comment, Follow
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.views.main import (
+    ALL_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR,
+)
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.utils.html import format_html
+from posts import moderation, search
+from posts.forms import cache_choices
+from posts.models import Post, Group, Comment, Follow, ModerationTask
+from posts.paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех значений в боковой панели."""
+    template = 'admin/input_filter.html'
+    suggestions_url = None
+
+    def lookups(self, request, model_admin):
+        # Непустой ответ нужен, чтобы фильтр отображался.
+        return ((),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (key, value)
+            for key, value in changelist.get_filters_params().items()
+            if key != self.parameter_name
+        ]
+        yield all_choice
+
+
+class AuthorFilter(InputFilter):
+    title = 'автор'
+    parameter_name = 'author'
+    suggestions_url = 'posts:user_suggestions'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(author__username=self.value().strip())
+        return queryset
+
+
+class ModerationActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        cache_choices(self.fields['group'])
+
+
+def _queue(modeladmin, request, action, **kwargs):
+    task = moderation.queue(action, user=request.user, **kwargs)
+    url = reverse('admin:posts_moderationtask_change', args=(task.pk,))
+    modeladmin.message_user(request, format_html(
+        'Задача «{}» поставлена в очередь: <a href="{}">ход выполнения</a>.',
+        task.get_action_display(), url))
+
+
+def _authors(queryset):
+    return queryset.order_by().values_list('author_id', flat=True).distinct()
+
+
+def _selected_posts(modeladmin, request, queryset):
+    """Посты для задачи: id отмеченных или фильтры списка.
+
+    При «выбрать все» задача получает фильтры, а не id всей выборки.
+    None — в списке фильтр, который задача повторить не умеет.
+    """
+    if request.POST.get('select_across') != '1':
+        return {'targets': queryset.values_list('pk', flat=True)}
+    filters = {
+        moderation.SEARCH if name == SEARCH_VAR else name: value
+        for name, value in request.GET.items()
+        if name not in (ALL_VAR, ORDER_VAR, PAGE_VAR)
+    }
+    if not set(filters) <= {*moderation.FILTERS, moderation.SEARCH}:
+        modeladmin.message_user(
+            request, 'С этими фильтрами «выбрать все» недоступно: '
+            'отметьте посты на странице.', messages.WARNING)
+        return None
+    return {'filters': filters}
+
+
+def move_to_group(modeladmin, request, queryset):
+    # Поле action формы получает варианты только внутри changelist,
+    # поэтому проверяется одно поле группы.
+    try:
+        group = ModerationActionForm.base_fields['group'].clean(
+            request.POST.get('group'))
+    except ValidationError:
+        group = None
+    if group is None:
+        modeladmin.message_user(
+            request, 'Выберите группу для переноса.', messages.WARNING)
+        return
+    posts = _selected_posts(modeladmin, request, queryset)
+    if posts is not None:
+        _queue(modeladmin, request, ModerationTask.MOVE_TO_GROUP,
+               group=group, **posts)
+
+
+move_to_group.short_description = 'Перенести в выбранную группу'
+
+
+def delete_posts_by_author(modeladmin, request, queryset):
+    _queue(modeladmin, request, ModerationTask.DELETE_POSTS,
+           targets=_authors(queryset))
+
+
+delete_posts_by_author.short_description = 'Удалить все посты авторов'
+
+
+def delete_comments_by_author(modeladmin, request, queryset):
+    _queue(modeladmin, request, ModerationTask.DELETE_COMMENTS,
+           targets=_authors(queryset))
+
+
+delete_comments_by_author.short_description = (
+    'Удалить все комментарии авторов')
+
+
+def purge_images(modeladmin, request, queryset):
+    posts = _selected_posts(modeladmin, request, queryset)
+    if posts is not None:
+        _queue(modeladmin, request, ModerationTask.PURGE_IMAGES, **posts)
+
+
+purge_images.short_description = 'Удалить картинки постов'
+
+
+class PerformanceAdmin(admin.ModelAdmin):
+    """Списки для больших таблиц: без COUNT(*) по всей таблице."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(PerformanceAdmin):
     list_display = (
         'pk',
         'image',
@@ -12,11 +148,38 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    # Фильтр по дате — фиксированные интервалы, без запросов к БД.
+    # date_hierarchy не нужен: он читает DISTINCT дат по всей таблице.
+    list_filter = ('pub_date', AuthorFilter)
+    raw_id_fields = ('author',)
+    action_form = ModerationActionForm
+    actions = (
+        move_to_group,
+        delete_posts_by_author,
+        delete_comments_by_author,
+        purge_images,
+    )
     empty_value_display = '-пусто-'
     verbose_name = 'Посты'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_feed()
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # list_editable строит поле на каждую строку списка.
+            cache_choices(field)
+        return field
+
+    def get_search_results(self, request, queryset, search_term):
+        # Полнотекстовый индекс вместо LIKE '%...%' по всей таблице.
+        if not search_term:
+            return queryset, False
+        return search.apply(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
@@ -24,35 +187,69 @@ class GroupAdmin(admin.ModelAdmin):
         'title',
         'description',
     )
-    search_fields = ('text',)
+    search_fields = ('title', 'slug')
     list_filter = ('title',)
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(PerformanceAdmin):
     list_display = (
         'post',
         'author',
         'text',
         'created',
     )
+    list_select_related = ('post', 'author')
     search_fields = ('text',)
-    list_filter = ('author',)
+    list_filter = (AuthorFilter,)
+    raw_id_fields = ('post', 'author')
+    actions = (delete_comments_by_author,)
     empty_value_display = '-пусто-'
     verbose_name = 'Комментарий',
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(PerformanceAdmin):
     list_display = (
         'author',
         'user',
     )
-    list_filter = ('author',)
+    list_select_related = ('author', 'user')
+    list_filter = (AuthorFilter,)
+    raw_id_fields = ('author', 'user')
     empty_value_display = '-пусто-'
     verbose_name = 'Подписчики',
 
 
+class ModerationTaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'action',
+        'status',
+        'progress',
+        'created_by',
+        'created',
+        'finished',
+    )
+    list_filter = ('status', 'action')
+    list_select_related = ('created_by',)
+    readonly_fields = ('progress',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def progress(self, task):
+        return format_html(
+            '<progress value="{}" max="{}"></progress> {} из {}',
+            task.processed, task.total or 1, task.processed, task.total)
+
+    progress.short_description = 'Ход выполнения'
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(ModerationTask, ModerationTaskAdmin)
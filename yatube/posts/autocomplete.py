@@ -0,0 +1,134 @@
+"""Подсказки по группам и пользователям из отсортированного индекса.
+
+Индекс живёт в памяти процесса: отсортированный список пар
+``(ключ, id)``, префикс ищется ``bisect`` за O(log n) без запроса к БД.
+Изменения своего процесса вносятся в индекс точечно (сигналы в
+``posts.signals``); об изменениях в других процессах индекс узнаёт по
+номеру версии в общем кэше и тогда перестраивается целиком.
+"""
+import bisect
+import threading
+
+from django.contrib.auth import get_user_model
+
+from posts import caching
+from posts.models import Group
+
+User = get_user_model()
+LIMIT = 10
+
+
+class PrefixIndex:
+    def __init__(self, name, load, keys, item):
+        self.name = name
+        self._load = load
+        self._keys = keys
+        self._item = item
+        self._lock = threading.Lock()
+        # (entries, items): заменяется целиком, на месте не меняется.
+        self._snapshot = None
+        self._keys_by_pk = {}
+        self._version = None
+
+    def _ensure(self):
+        """Текущий снимок индекса; поиск читает только его."""
+        version = caching.version('autocomplete', self.name)
+        snapshot = self._snapshot
+        if snapshot is not None and self._version == version:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and self._version == version:
+                return self._snapshot
+            entries, items, keys_by_pk = [], {}, {}
+            for obj in self._load():
+                keys = self._keys(obj)
+                items[obj.pk], keys_by_pk[obj.pk] = self._item(obj), keys
+                entries.extend((key, obj.pk) for key in keys)
+            entries.sort()
+            self._snapshot = entries, items
+            self._keys_by_pk = keys_by_pk
+            self._version = version
+            return self._snapshot
+
+    def search(self, prefix, limit=LIMIT):
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return []
+        entries, items = self._ensure()
+        start = bisect.bisect_left(entries, (prefix,))
+        found = []
+        for index in range(start, len(entries)):
+            key, pk = entries[index]
+            if not key.startswith(prefix) or len(found) == limit:
+                break
+            if pk not in found:
+                found.append(pk)
+        return [items[pk] for pk in found]
+
+    def _remove(self, entries, items, pk):
+        items.pop(pk, None)
+        for key in self._keys_by_pk.pop(pk, ()):
+            index = bisect.bisect_left(entries, (key, pk))
+            if index < len(entries) and entries[index] == (key, pk):
+                del entries[index]
+
+    def _changed(self, apply):
+        """Правит свой индекс и сообщает остальным процессам.
+
+        Правка идёт по копии: поиск в других потоках дочитывает прежний
+        снимок.
+        """
+        version = caching.bump('autocomplete', self.name)
+        with self._lock:
+            if self._snapshot is None:
+                return
+            entries, items = list(self._snapshot[0]), dict(self._snapshot[1])
+            apply(entries, items)
+            if version is not None and self._version == version - 1:
+                self._snapshot = entries, items
+                self._version = version
+            else:
+                # Пропустили чужое изменение: перестроимся при чтении.
+                self._snapshot = None
+
+    def update(self, obj):
+        def apply(entries, items):
+            self._remove(entries, items, obj.pk)
+            keys = self._keys(obj)
+            if not keys:
+                return
+            items[obj.pk], self._keys_by_pk[obj.pk] = self._item(obj), keys
+            for key in keys:
+                bisect.insort(entries, (key, obj.pk))
+        self._changed(apply)
+
+    def delete(self, pk):
+        self._changed(
+            lambda entries, items: self._remove(entries, items, pk))
+
+
+def _group_keys(group):
+    title = group.title.casefold()
+    # Полное название, каждое слово названия и слаг.
+    return {title, group.slug.casefold(), *title.split()}
+
+
+def _user_keys(user):
+    return {user.username.casefold()} if user.is_active else set()
+
+
+groups = PrefixIndex(
+    'groups',
+    load=lambda: Group.objects.only('title', 'slug').iterator(),
+    keys=_group_keys,
+    item=lambda group: {
+        'id': group.pk, 'title': group.title, 'slug': group.slug},
+)
+users = PrefixIndex(
+    'users',
+    load=lambda: User.objects.filter(is_active=True).only(
+        'username', 'first_name', 'last_name', 'is_active').iterator(),
+    keys=_user_keys,
+    item=lambda user: {
+        'username': user.username, 'name': user.get_full_name()},
+)
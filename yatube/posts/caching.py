@@ -0,0 +1,65 @@
+"""Версионированные ключи кэша для лент и страницы поста.
+
+Каждая лента (общая, группа, автор, пост) имеет номер версии в кэше.
+Версия входит в ключ фрагмента и увеличивается сигналами ``Post`` и
+``Comment``, поэтому после записи устаревший фрагмент просто перестаёт
+адресоваться — без окна устаревания и без перебора ключей.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from core import db
+from yatube.settings import FEED_CACHE_TTL
+
+
+def _version_key(scope, ident):
+    return f'posts:version:{scope}:{ident}'
+
+
+def version(scope, ident=''):
+    key = _version_key(scope, ident)
+    value = cache.get(key)
+    if value is None:
+        # Начинаем с метки времени, чтобы не попасть на фрагменты,
+        # оставшиеся от вытесненной из кэша версии.
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def bump(scope, ident=''):
+    """Увеличивает версию; возвращает новую или None, если её не было."""
+    try:
+        return cache.incr(_version_key(scope, ident))
+    except ValueError:
+        return None
+
+
+def fragment(request, scope, ident=''):
+    """Контекст для ``{% cache cache_timeout <name> cache_key %}``."""
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    auth = int(request.user.is_authenticated)
+    return {
+        'cache_key': f'{scope}:{ident}:{version(scope, ident)}:{path}:{auth}',
+        'cache_timeout': db.cache_timeout(FEED_CACHE_TTL),
+    }
+
+
+def post_changed(post, old_group_id=None):
+    bump('index')
+    bump('ranked')
+    bump('author', post.author_id)
+    bump('post', post.pk)
+    for group_id in {post.group_id, old_group_id} - {None}:
+        bump('group', group_id)
+
+
+def comment_changed(comment, post=None):
+    # Число комментариев видно и в лентах: с известным постом
+    # сбрасываются и они.
+    if post is not None:
+        post_changed(post)
+    else:
+        bump('post', comment.post_id)
@@ -0,0 +1,88 @@
+"""Постраничная загрузка комментариев к посту.
+
+Комментарии идут по ``(created, pk)`` keyset-пагинацией
+(``CursorPaginator``), автор подтягивается тем же запросом. Первая
+страница кэшируется под версией поста, которую увеличивают сигналы
+``Comment``; следующие страницы отдаёт JSON-эндпоинт «Показать ещё».
+
+Новые комментарии сохраняет ``add`` — сразу или через очередь
+``core.writebehind``.
+"""
+from datetime import datetime
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from core import db, writebehind
+from posts import caching
+from posts.models import Comment, Post
+from posts.paginators import CursorPaginator
+from yatube.settings import FEED_CACHE_TTL, NUM_COMMENTS
+
+ORDERING = ('created', 'pk')
+
+
+def _serialize(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'created': comment.created,
+        'author': {
+            'username': comment.author.username,
+            'name': comment.author.get_full_name(),
+        },
+    }
+
+
+def _load(post_id, cursor):
+    queryset = Comment.objects.filter(post_id=post_id).select_related(
+        'author').only(
+            'text', 'created', 'post_id', 'author__username',
+            'author__first_name', 'author__last_name')
+    page = CursorPaginator(queryset, NUM_COMMENTS, ORDERING).page(cursor)
+    return {
+        'results': [_serialize(comment) for comment in page],
+        'next': page.next_cursor,
+    }
+
+
+def page(post_id, cursor=None):
+    """Страница комментариев: ``{'results': [...], 'next': курсор}``."""
+    if cursor:
+        return _load(post_id, cursor)
+    key = f'posts:comments:{post_id}:{caching.version("post", post_id)}'
+    first = cache.get(key)
+    if first is None:
+        first = _load(post_id, None)
+        cache.set(key, first, db.cache_timeout(FEED_CACHE_TTL))
+    return first
+
+
+def _create(post_id, author_id, text, queued):
+    post = Post.objects.filter(pk=post_id).only(
+        'author_id', 'group_id').first()
+    if post is None:
+        # Пост удалили, пока комментарий ждал в очереди.
+        return
+    Comment.objects.create(post=post, author_id=author_id, text=text)
+
+
+def _replay(post_id, author_id, text, queued):
+    # Пачку могли применить, но не успеть обрезать журнал.
+    if not Comment.objects.filter(
+            post_id=post_id, author_id=author_id, text=text,
+            created__gte=datetime.fromisoformat(queued)).exists():
+        _create(post_id, author_id, text, queued)
+
+
+writebehind.register('comment', _create, _replay)
+
+
+def add(comment):
+    """Сохраняет проверенный комментарий; при отложенной записи — в очередь."""
+    if not writebehind.enabled():
+        comment.save()
+        return
+    writebehind.submit(
+        'comment', comment.post_id, comment.author_id, comment.text,
+        timezone.now().isoformat())
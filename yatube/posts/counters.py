@@ -0,0 +1,102 @@
+"""Счётчики постов и подписок без COUNT(*) на каждом запросе.
+
+Значения живут в кэше с TTL и поддерживаются инкрементально
+сигналами ``Post`` и ``Follow`` (см. ``posts.signals``); после истечения
+TTL счётчик пересчитывается, что ограничивает возможный дрейф.
+"""
+from django.core.cache import cache
+
+from core import db
+from posts.models import Follow, Post, PostRank
+from yatube.settings import POST_COUNT_TTL, POST_COUNT_ESTIMATE_FROM
+
+
+def _key(scope, pk=''):
+    return f'posts:count:{scope}:{pk}'
+
+
+def _cached(key, count):
+    value = cache.get(key)
+    if value is None:
+        value = count()
+        cache.set(key, value, POST_COUNT_TTL)
+    return value
+
+
+def _count_rows(model):
+    estimate = db.estimated_rows(model)
+    if estimate is not None and estimate >= POST_COUNT_ESTIMATE_FROM:
+        return estimate
+    return model.objects.count()
+
+
+def total_posts():
+    return _cached(_key('total'), lambda: _count_rows(Post))
+
+
+def ranked_posts():
+    """Постов в лентах «горячее» и «популярные авторы» (с PostRank)."""
+    return _cached(_key('ranked'), lambda: _count_rows(PostRank))
+
+
+def author_posts(author_id):
+    return _cached(
+        _key('author', author_id),
+        Post.objects.filter(author_id=author_id).count,
+    )
+
+
+def group_posts(group_id):
+    return _cached(
+        _key('group', group_id),
+        Post.objects.filter(group_id=group_id).count,
+    )
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Счётчика нет в кэше: его посчитают при следующем чтении.
+        pass
+
+
+def post_added(author_id, group_id, delta=1):
+    _incr(_key('total'), delta)
+    _incr(_key('author', author_id), delta)
+    if group_id is not None:
+        _incr(_key('group', group_id), delta)
+
+
+def post_removed(author_id, group_id, delta=1):
+    post_added(author_id, group_id, -delta)
+
+
+def post_moved(old_group_id, new_group_id):
+    if old_group_id is not None:
+        _incr(_key('group', old_group_id), -1)
+    if new_group_id is not None:
+        _incr(_key('group', new_group_id), 1)
+
+
+def followers(author_id):
+    return _cached(
+        _key('followers', author_id),
+        Follow.objects.filter(author_id=author_id).count,
+    )
+
+
+def following(user_id):
+    return _cached(
+        _key('following', user_id),
+        Follow.objects.filter(user_id=user_id).count,
+    )
+
+
+def follow_added(user_id, author_id, delta=1):
+    _incr(_key('followers', author_id), delta)
+    _incr(_key('following', user_id), delta)
+
+
+def follow_removed(user_id, author_id, delta=1):
+    follow_added(user_id, author_id, -delta)
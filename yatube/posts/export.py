@@ -0,0 +1,79 @@
+"""Потоковая выгрузка данных в JSONL/CSV.
+
+Строки читаются ``iterator(chunk_size=...)`` (на PostgreSQL — серверным
+курсором) и сериализуются по одной, поэтому расход памяти не зависит от
+размера таблицы. Колонки постов совпадают с форматом ``import_posts``.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Follow, Group, Post
+
+CHUNK_SIZE = 2000
+# Колонка выгрузки -> поле для values_list.
+DATASETS = {
+    'posts': (Post, {
+        'id': 'pk',
+        'author': 'author__username',
+        'text': 'text',
+        'group': 'group__slug',
+        'pub_date': 'pub_date',
+        'image': 'image',
+    }),
+    'comments': (Comment, {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, {
+        'id': 'pk',
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+    'groups': (Group, {
+        'id': 'pk',
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    }),
+}
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def rows(name):
+    model, columns = DATASETS[name]
+    queryset = model.objects.order_by('pk').values_list(*columns.values())
+    return queryset.iterator(chunk_size=CHUNK_SIZE)
+
+
+class _Echo:
+    """Файлоподобный объект, который возвращает записанное csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _jsonl(name):
+    columns = list(DATASETS[name][1])
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows(name):
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def _csv(name):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(DATASETS[name][1])
+    for row in rows(name):
+        yield writer.writerow(row)
+
+
+def lines(name, file_format):
+    """Генератор строк выгрузки ``name`` в формате ``file_format``."""
+    serializers = {'jsonl': _jsonl, 'csv': _csv}
+    return serializers[file_format](name)
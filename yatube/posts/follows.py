@@ -0,0 +1,101 @@
+"""Граф подписок: пакетные подписки, проверки и счётчики.
+
+При ``WRITE_BEHIND`` ``follow`` и ``unfollow`` ставят изменение в очередь
+``core.writebehind`` и возвращают ``True``, не зная, изменилось ли что-то.
+"""
+from django.db import IntegrityError, transaction
+
+from core import writebehind
+from posts import counters, ranking, timeline
+from posts.models import Follow
+
+
+def on_follow(user_id, author_id):
+    counters.follow_added(user_id, author_id)
+    ranking.followers_changed(author_id)
+    if timeline.enabled():
+        timeline.backfill(user_id, author_id)
+
+
+def on_unfollow(user_id, author_id):
+    counters.follow_removed(user_id, author_id)
+    ranking.followers_changed(author_id)
+    if timeline.enabled():
+        timeline.remove(user_id, author_id)
+
+
+def _follow(user_id, author_id):
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user_id=user_id, author_id=author_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _unfollow(user_id, author_id):
+    deleted, _ = Follow.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+    return bool(deleted)
+
+
+# Оба действия идемпотентны: проигрыш журнала ничего не удваивает.
+writebehind.register('follow', _follow)
+writebehind.register('unfollow', _unfollow)
+
+
+def follow(user, author):
+    """Подписывает одним INSERT; повтор отсекает уникальный индекс."""
+    if user.pk == author.pk:
+        return False
+    if writebehind.enabled():
+        writebehind.submit('follow', user.pk, author.pk)
+        return True
+    return _follow(user.pk, author.pk)
+
+
+def unfollow(user, author_id):
+    if writebehind.enabled():
+        writebehind.submit('unfollow', user.pk, author_id)
+        return True
+    return _unfollow(user.pk, author_id)
+
+
+def following_ids(user, author_ids):
+    """На каких из ``author_ids`` подписан ``user`` — одним запросом."""
+    if not user.is_authenticated:
+        return set()
+    return set(Follow.objects.filter(
+        user=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+
+def is_following(user, author):
+    return author.pk in following_ids(user, [author.pk])
+
+
+def follow_many(user, author_ids):
+    author_ids = set(author_ids) - {user.pk}
+    new_ids = author_ids - following_ids(user, author_ids)
+    # bulk_create не шлёт сигналов, поэтому побочные эффекты — вручную.
+    Follow.objects.bulk_create(
+        (Follow(user=user, author_id=author_id) for author_id in new_ids),
+        ignore_conflicts=True,
+    )
+    for author_id in new_ids:
+        on_follow(user.pk, author_id)
+    return new_ids
+
+
+def unfollow_many(user, author_ids):
+    old_ids = following_ids(user, author_ids)
+    Follow.objects.filter(user=user, author_id__in=old_ids).delete()
+    return old_ids
+
+
+def followers_count(author):
+    return counters.followers(author.pk)
+
+
+def following_count(user):
+    return counters.following(user.pk)
@@ -1,5 +1,52 @@
 from django import forms
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from django.forms.models import ModelChoiceIterator
+from posts import caching, uploads
 from posts.models import Post, Comment
+from yatube.settings import FEED_CACHE_TTL
+
+
+class CachedChoiceIterator(ModelChoiceIterator):
+    """Варианты выбора из общего кэша вместо запроса при каждом рендере.
+
+    Список версионируется по модели (``caching.version('choices', ...)``),
+    версию увеличивают сигналы сохранения и удаления.
+    """
+
+    def _cached_choices(self):
+        if not hasattr(self, '_choices'):
+            label = self.queryset.model._meta.label_lower
+            key = f'posts:choices:{label}:{caching.version("choices", label)}'
+            choices = cache.get(key)
+            if choices is None:
+                choices = [
+                    self.choice(obj) for obj in self.queryset.iterator()]
+                cache.set(key, choices, FEED_CACHE_TTL)
+            self._choices = choices
+        return self._choices
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        yield from self._cached_choices()
+
+    def __len__(self):
+        empty = 1 if self.field.empty_label is not None else 0
+        return len(self._cached_choices()) + empty
+
+    def __bool__(self):
+        return (
+            self.field.empty_label is not None
+            or bool(self._cached_choices())
+        )
+
+
+def cache_choices(field):
+    """Переключает ModelChoiceField на кэшированный список вариантов."""
+    field.iterator = CachedChoiceIterator
+    field.widget.choices = field.choices
+    return field
 
 
 class PostForm(forms.ModelForm):
@@ -7,6 +54,16 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        cache_choices(self.fields['group'])
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image = uploads.process(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
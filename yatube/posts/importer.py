@@ -0,0 +1,180 @@
+"""Пакетный импорт постов (см. ``manage.py import_posts``).
+
+Строки — словари с ключами ``author`` (username), ``text`` и
+необязательными ``group`` (slug), ``pub_date`` (ISO 8601) и ``image``
+(путь к файлу). Посты пишутся ``bulk_create`` пачками, каждая в своей
+транзакции. Сигналы при этом не срабатывают, поэтому счётчики, версии
+кэша, ленты подписок, поисковый индекс, рейтинги и миниатюры обновляются
+здесь же.
+"""
+import contextlib
+import itertools
+import os
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import db
+from posts import caching, counters, ranking, search, thumbnails, timeline
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+BATCH_SIZE = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+@contextlib.contextmanager
+def original_pub_date():
+    """Отключает ``auto_now_add``, чтобы сохранить даты из источника."""
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Importer:
+    def __init__(self, batch_size=BATCH_SIZE, images_dir=None,
+                 create_users=False):
+        self.batch_size = batch_size
+        self.images_dir = images_dir
+        self.create_users = create_users
+        self.authors = {}
+        self.groups = {}
+        self.touched_authors = set()
+        self.stats = Counter()
+        self.errors = []
+
+    def _resolve(self, batch):
+        usernames = {row.get('author') for row in batch} - {None}
+        missing = usernames - self.authors.keys()
+        if missing and self.create_users:
+            User.objects.bulk_create(
+                (User(username=name) for name in missing),
+                ignore_conflicts=True,
+            )
+        self.authors.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'pk')
+        )
+        slugs = {row.get('group') for row in batch} - {None, ''}
+        missing = slugs - self.groups.keys()
+        self.groups.update(
+            Group.objects.filter(slug__in=missing).values_list('slug', 'pk'))
+
+    def _image(self, path):
+        if self.images_dir:
+            path = os.path.join(self.images_dir, path)
+        if not os.path.isfile(path):
+            raise RowError(f'нет файла {path}')
+        with open(path, 'rb') as source:
+            return default_storage.save(
+                f'posts/{os.path.basename(path)}', File(source))
+
+    def _build(self, row):
+        author_id = self.authors.get(row.get('author'))
+        if author_id is None:
+            raise RowError(f'неизвестный автор {row.get("author")!r}')
+        if not row.get('text'):
+            raise RowError('пустой текст')
+        group_id = None
+        if row.get('group'):
+            group_id = self.groups.get(row['group'])
+            if group_id is None:
+                raise RowError(f'неизвестная группа {row["group"]!r}')
+        pub_date = timezone.now()
+        if row.get('pub_date'):
+            try:
+                pub_date = parse_datetime(row['pub_date'])
+            except ValueError:
+                # Формат верный, но даты нет в календаре (30 февраля).
+                pub_date = None
+            if pub_date is None:
+                raise RowError(f'неверная дата {row["pub_date"]!r}')
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        image = self._image(row['image']) if row.get('image') else ''
+        return Post(
+            text=row['text'], author_id=author_id, group_id=group_id,
+            pub_date=pub_date, image=image,
+        )
+
+    def _import_batch(self, batch, first_line):
+        self._resolve(batch)
+        posts = []
+        for line, row in enumerate(batch, first_line):
+            try:
+                posts.append(self._build(row))
+            except RowError as error:
+                self.stats['skipped'] += 1
+                self.errors.append((line, str(error)))
+        with db.write_transaction(), original_pub_date():
+            if connection.features.can_return_ids_from_bulk_insert:
+                Post.objects.bulk_create(posts)
+                ids = [post.pk for post in posts]
+            else:
+                # bulk_create на SQLite не возвращает pk. Блокировка записи
+                # взята с начала транзакции, поэтому новые посты — ровно
+                # те, что появились после последнего id: чужие запросы
+                # вставить между ними ничего не могут.
+                last_pk = Post.objects.aggregate(last=Max('pk'))['last']
+                Post.objects.bulk_create(posts)
+                ids = list(Post.objects.filter(
+                    pk__gt=last_pk or 0).values_list('pk', flat=True))
+        self.stats['created'] += len(posts)
+        self._after_batch(posts, Post.objects.filter(pk__in=ids))
+
+    def _after_batch(self, posts, created):
+        added = Counter((post.author_id, post.group_id) for post in posts)
+        for (author_id, group_id), count in added.items():
+            counters.post_added(author_id, group_id, count)
+        caching.bump('index')
+        for author_id, group_id in added:
+            caching.bump('author', author_id)
+            if group_id is not None:
+                caching.bump('group', group_id)
+        self.touched_authors.update(author_id for author_id, _ in added)
+        search.reindex(created)
+        ranking.posts_created(created.only('pub_date', 'author_id'))
+        if any(post.image for post in posts):
+            for post in created.exclude(image='').only(
+                    'image', 'author_id', 'group_id'):
+                thumbnails.schedule(post)
+
+    def _fill_timelines(self):
+        if not timeline.enabled():
+            return
+        follows = Follow.objects.filter(
+            author_id__in=self.touched_authors
+        ).values_list('user_id', 'author_id')
+        for user_id, author_id in follows.iterator():
+            timeline.backfill(user_id, author_id)
+
+    def run(self, rows, progress=None):
+        line = 1
+        for batch in _chunks(rows, self.batch_size):
+            self._import_batch(batch, line)
+            line += len(batch)
+            if progress is not None:
+                progress(self.stats)
+        self._fill_timelines()
+        return self.stats
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает посты, комментарии, подписки или группы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=export.DATASETS)
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='jsonl')
+        parser.add_argument(
+            '--output', help='Файл выгрузки (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        lines = export.lines(options['dataset'], options['format'])
+        if options['output'] is None:
+            self._write(lines, self.stdout)
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as target:
+            count = self._write(lines, target)
+        self.stderr.write(f'Выгружено строк: {count}')
+
+    def _write(self, lines, target):
+        count = 0
+        for line in lines:
+            target.write(line)
+            count += 1
+        return count
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import ranking
+from posts.management.seed import seed
+from posts.models import Comment, Follow, Group, Post, PostRank, User
+from posts.paginators import FEED_ORDERING
+
+REPEAT = 20
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время запросов лент с составными индексами '
+        'и без них'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Сначала создать столько синтетических постов',
+        )
+
+    def queries(self):
+        author = User.objects.filter(posts__isnull=False).first()
+        group = Group.objects.filter(posts__isnull=False).first()
+        follower = User.objects.filter(follower__isnull=False).first()
+        post = Post.objects.filter(comments__isnull=False).first()
+        feed = Post.objects.for_feed().order_by(*FEED_ORDERING)
+        queries = {
+            'index': feed,
+            'group': feed.filter(group=group),
+            'profile': feed.filter(author=author),
+            'follow': feed.filter(author__following__user=follower),
+            'comments': Comment.objects.filter(post=post).order_by('created'),
+            'followers': Follow.objects.filter(author=author),
+        }
+        for name in ranking.FEEDS:
+            posts, ordering = ranking.feed(name)
+            queries[name] = posts.order_by(*ordering)
+        return queries
+
+    def report(self, title):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in self.queries().items():
+            page = queryset[:10]
+            started = time.perf_counter()
+            for _ in range(REPEAT):
+                list(page)
+            elapsed = (time.perf_counter() - started) / REPEAT * 1000
+            self.stdout.write(f'{name}: {elapsed:.2f} мс')
+            self.stdout.write(page.explain())
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            seed(options['seed'])
+        models = (Post, Comment, Follow, PostRank)
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for model in models:
+                        for index in model._meta.indexes:
+                            cursor.execute('DROP INDEX {}'.format(
+                                connection.ops.quote_name(index.name)))
+                self.report('Без составных индексов')
+                raise Rollback
+        except Rollback:
+            pass
+        # Новое соединение: SQLite не перепланирует закэшированный EXPLAIN.
+        connection.close()
+        self.report('С индексами')
@@ -0,0 +1,72 @@
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import BATCH_SIZE, Importer
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as source:
+        yield from csv.DictReader(source)
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты из JSONL или CSV '
+        '(author, text, group, pub_date, image)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=READERS)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог, относительно которого заданы пути картинок',
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных авторов',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат {file_format!r}, укажите --format')
+        importer = Importer(
+            batch_size=options['batch_size'],
+            images_dir=options['images_dir'],
+            create_users=options['create_users'],
+        )
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Импортировано {stats["created"]}, '
+                f'пропущено {stats["skipped"]} '
+                f'({stats["created"] / elapsed:.0f} постов/с)'
+            )
+
+        stats = importer.run(READERS[file_format](path), progress)
+        for line, error in importer.errors[:20]:
+            self.stderr.write(f'Запись {line}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {stats["created"]} постов за '
+            f'{time.perf_counter() - started:.1f} с'))
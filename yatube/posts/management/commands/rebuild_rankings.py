@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import ranking
+from posts.models import PostRank
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает рейтинги постов для ранжированных лент'
+
+    def handle(self, *args, **options):
+        ranking.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтингов постов: {PostRank.objects.count()}'))
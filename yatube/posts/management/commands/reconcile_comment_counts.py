@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import activity
+
+
+class Command(BaseCommand):
+    help = 'Сверяет comment_count и last_comment_at постов с комментариями'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=activity.BATCH_SIZE,
+            help='Постов в одном проходе (по диапазону id)',
+        )
+
+    def handle(self, *args, **options):
+        fixed = activity.reconcile(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Исправлено постов: {fixed}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import moderation
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет задачи модерации, оставшиеся в очереди или брошенные '
+        'остановленным процессом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale', type=int, default=None,
+            help='Через сколько секунд без новой пачки задача брошена '
+                 '(по умолчанию MODERATION_TASK_STALE)',
+        )
+
+    def handle(self, *args, **options):
+        resumed = moderation.resume(options['stale'])
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {resumed}'))
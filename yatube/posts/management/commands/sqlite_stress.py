@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+
+from core import writebehind
+from posts import comments, follows
+from posts.management.seed import seed
+from posts.models import Comment, Post, User
+from posts.paginators import FEED_ORDERING
+
+# Настройки Django по умолчанию: журнал отката, FULL, таймаут модуля
+# sqlite3 (5 с) и новое соединение на каждый запрос.
+BASELINE = {
+    'pragmas': {'busy_timeout': 5000, 'journal_mode': 'DELETE',
+                'synchronous': 'FULL'},
+    'conn_max_age': 0,
+    'write_behind': False,
+}
+
+
+def _profiles(journal):
+    tuned = {
+        'pragmas': settings.SQLITE_PRAGMAS,
+        'conn_max_age': settings.DATABASES['default']['CONN_MAX_AGE'],
+        'write_behind': False,
+    }
+    return {
+        'baseline': BASELINE,
+        'tuned': tuned,
+        # Коммит пачкой из очереди с журналом и fsync (core.writebehind).
+        'batched': {**tuned, 'write_behind': True, 'journal': journal},
+    }
+
+
+def _use(path, profile):
+    connections['default'].close()
+    database = connections['default'].settings_dict
+    database['NAME'] = path
+    database['CONN_MAX_AGE'] = profile['conn_max_age']
+    settings.SQLITE_PRAGMAS = profile['pragmas']
+    settings.WRITE_BEHIND = profile['write_behind']
+    if profile['write_behind']:
+        settings.WRITE_BEHIND_JOURNAL = profile['journal']
+
+
+def _read(rnd, post_ids, user_ids):
+    if rnd.random() < 0.5:
+        list(Post.objects.for_feed().order_by(*FEED_ORDERING)[:10])
+    else:
+        comments.page(rnd.choice(post_ids))
+
+
+def _comment(rnd, post_ids, user_ids):
+    # Как add_comment: пост читается для проверки, запись — через add.
+    post = Post.objects.only('pk').get(pk=rnd.choice(post_ids))
+    comments.add(Comment(
+        post=post, author_id=rnd.choice(user_ids),
+        text='Нагрузочный комментарий'))
+
+
+def _follow(rnd, post_ids, user_ids):
+    user = User(pk=rnd.choice(user_ids))
+    author = User(pk=rnd.choice(user_ids))
+    if rnd.random() < 0.5:
+        follows.follow(user, author)
+    else:
+        follows.unfollow(user, author.pk)
+
+
+def _worker(args):
+    path, profile, number, seconds, writes = args
+    _use(path, profile)
+    rnd = random.Random(number)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    latencies = {'read': [], 'write': []}
+    locked = commented = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        kind = 'write' if rnd.random() < writes else 'read'
+        operation = (
+            rnd.choice((_comment, _follow)) if kind == 'write' else _read)
+        started = time.perf_counter()
+        try:
+            operation(rnd, post_ids, user_ids)
+        except OperationalError:
+            locked += 1
+            continue
+        finally:
+            # Граница запроса: как request_finished в настоящем воркере.
+            close_old_connections()
+        latencies[kind].append(time.perf_counter() - started)
+        commented += operation is _comment
+    writebehind.flush()
+    connections['default'].close()
+    return latencies, locked, commented
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест записи в SQLite несколькими процессами: '
+        'настройки по умолчанию, SQLITE_PRAGMAS с CONN_MAX_AGE и '
+        'отложенная запись пачками'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument(
+            '--writes', type=float, default=0.3,
+            help='Доля записей (комментарии и подписки) в нагрузке',
+        )
+        parser.add_argument('--seed', type=int, default=2000)
+
+    def report(self, name, results, seconds):
+        reads = [value for latencies, _, _ in results
+                 for value in latencies['read']]
+        writes = [value for latencies, _, _ in results
+                  for value in latencies['write']]
+        locked = sum(errors for _, errors, _ in results)
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f'записей: {len(writes) / seconds:.0f}/с, '
+            f'чтений: {len(reads) / seconds:.0f}/с, '
+            f'database is locked: {locked}')
+        for kind, values in (('запись', writes), ('чтение', reads)):
+            if len(values) < 2:
+                continue
+            cuts = statistics.quantiles(values, n=100)
+            self.stdout.write(
+                f'{kind}: p50 {cuts[49] * 1000:.1f} мс, '
+                f'p95 {cuts[94] * 1000:.1f} мс, '
+                f'max {max(values) * 1000:.1f} мс')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Тест рассчитан на SQLite')
+        workdir = tempfile.mkdtemp()
+        profiles = _profiles(os.path.join(workdir, 'journal'))
+        # Рабочая база не трогается: тест идёт на свежей копии схемы.
+        original = connections['default'].settings_dict['NAME']
+        try:
+            template = os.path.join(workdir, 'template.sqlite3')
+            _use(template, profiles['tuned'])
+            call_command('migrate', verbosity=0)
+            seed(options['seed'])
+            connections['default'].close()
+            context = multiprocessing.get_context('fork')
+            for name, profile in profiles.items():
+                path = os.path.join(workdir, f'{name}.sqlite3')
+                shutil.copy(template, path)
+                # Режим журнала меняется монопольно: один раз до воркеров.
+                _use(path, profile)
+                comments_before = Comment.objects.count()
+                connections['default'].close()
+                with context.Pool(options['workers']) as pool:
+                    results = pool.map(_worker, [
+                        (path, profile, number, options['seconds'],
+                         options['writes'])
+                        for number in range(options['workers'])
+                    ])
+                self.report(name, results, options['seconds'])
+                # Отложенная запись не должна терять подтверждённое.
+                _use(path, profile)
+                self.stdout.write(
+                    f'комментариев подтверждено: '
+                    f'{sum(commented for _, _, commented in results)}, '
+                    f'в базе: {Comment.objects.count() - comments_before}')
+                connections['default'].close()
+        finally:
+            _use(original, profiles['tuned'])
+            shutil.rmtree(workdir)
@@ -0,0 +1,83 @@
+import io
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts import uploads
+
+
+def _naive(path):
+    # Так ведёт себя наивная обработка: файл целиком в памяти и полное
+    # декодирование пикселей.
+    with open(path, 'rb') as source:
+        image = Image.open(io.BytesIO(source.read()))
+        image.load()
+
+
+def _bounded(path):
+    upload = TemporaryUploadedFile(
+        'photo.jpg', 'image/jpeg', os.path.getsize(path), None)
+    with open(path, 'rb') as source:
+        shutil.copyfileobj(source, upload.file)
+    upload.file.flush()
+    uploads.process(upload).close()
+
+
+def _measure(func, path, queue):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    try:
+        func(path)
+    except ValidationError as error:
+        queue.put(error.messages[0])
+        return
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((after - before, elapsed))
+
+
+class Command(BaseCommand):
+    help = 'Пиковая память обработки загруженной фотографии'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=6000)
+        parser.add_argument('--height', type=int, default=4000)
+
+    def handle(self, *args, **options):
+        size = (options['width'], options['height'])
+        workdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(workdir, 'photo.jpg')
+            bands = [Image.effect_noise(size, 64) for _ in range(3)]
+            Image.merge('RGB', bands).save(path, quality=90)
+            self.stdout.write(
+                f'{size[0]}x{size[1]}, '
+                f'{os.path.getsize(path) / 2 ** 20:.1f} МБ на диске')
+            # Каждый замер в своём процессе: ru_maxrss не уменьшается.
+            context = multiprocessing.get_context('fork')
+            for title, func in (
+                ('Полное декодирование', _naive),
+                ('posts.uploads.process', _bounded),
+            ):
+                queue = context.Queue()
+                process = context.Process(
+                    target=_measure, args=(func, path, queue))
+                process.start()
+                result = queue.get()
+                process.join()
+                if isinstance(result, str):
+                    self.stdout.write(f'{title}: отклонено — {result}')
+                    continue
+                peak, elapsed = result
+                self.stdout.write(
+                    f'{title}: +{peak / 1024:.1f} МБ RSS, {elapsed:.2f} с')
+        finally:
+            shutil.rmtree(workdir)
@@ -0,0 +1,57 @@
+"""Наполнение базы синтетическими данными для бенчмарков."""
+import random
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from posts import activity, ranking
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def seed(posts, users=None, groups=20, follows_per_user=50,
+         comments_per_post=1, prefix='bench'):
+    """Создаёт пользователей, группы, посты, подписки и комментарии."""
+    users = users or max(posts // 100, 2)
+    rnd = random.Random(posts)
+    with transaction.atomic():
+        User.objects.bulk_create(
+            (User(username=f'{prefix}_{i}') for i in range(users))
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_').values_list('pk', flat=True))
+        Group.objects.bulk_create(
+            (Group(title=f'Группа {i}', slug=f'{prefix}-{i}',
+                   description='') for i in range(groups))
+        )
+        group_ids = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('pk', flat=True))
+        Post.objects.bulk_create(
+            (Post(text=f'Пост {i}', author_id=rnd.choice(user_ids),
+                  group_id=rnd.choice(group_ids + [None]))
+             for i in range(posts))
+        )
+        pairs = {
+            (user_id, author_id)
+            for user_id in user_ids
+            for author_id in rnd.sample(
+                user_ids, min(follows_per_user, len(user_ids)))
+            if user_id != author_id
+        }
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs)
+        )
+        post_ids = Post.objects.filter(
+            author_id__in=user_ids).values_list('pk', flat=True)
+        Comment.objects.bulk_create(
+            (Comment(post_id=post_id, author_id=rnd.choice(user_ids),
+                     text='Комментарий')
+             for post_id in post_ids.iterator()
+             for _ in range(comments_per_post))
+        )
+    # bulk_create обходит сигналы: денормализованные поля — отдельно.
+    activity.reconcile()
+    ranking.rebuild()
+    return user_ids, group_ids
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import F, Min
+
+
+def remove_invalid_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    # Подзапрос, а не список: id не упираются в лимит параметров SQLite.
+    first_ids = Follow.objects.values('user', 'author').annotate(
+        first_id=Min('id')).values_list('first_id', flat=True)
+    Follow.objects.exclude(id__in=first_ids).delete()
+    Follow.objects.filter(user=F('author')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_invalid_follows, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follow_user_author_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='following'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=models.F('author')), name='no_self_follow'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # Документы SQLite зависят от текущего стеммера, поэтому индекс
+        # заполняет пачками manage.py rebuild_search_index, а не миграция.
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_search USING fts5('
+            "body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE posts_search ('
+            'post_id integer PRIMARY KEY '
+            'REFERENCES posts_post (id) ON DELETE CASCADE '
+            'DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX posts_search_document_idx '
+            'ON posts_search USING GIN (document)'
+        )
+        schema_editor.execute(
+            'INSERT INTO posts_search (post_id, document) '
+            "SELECT p.id, to_tsvector('russian', "
+            "concat_ws(' ', p.text, g.title)) "
+            'FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_follow_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
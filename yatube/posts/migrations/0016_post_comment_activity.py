@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comment_activity(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    Post.objects.update(
+        comment_count=Coalesce(Subquery(
+            comments.values('post').annotate(count=Count('pk'))
+            .values('count'),
+            output_field=models.IntegerField(),
+        ), 0),
+        last_comment_at=Subquery(
+            comments.order_by('-created').values('created')[:1],
+            output_field=models.DateTimeField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_moderationtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний комментарий'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-last_comment_at', '-id'], name='post_last_comment_idx'),
+        ),
+        migrations.RunPython(
+            fill_comment_activity, migrations.RunPython.noop),
+    ]
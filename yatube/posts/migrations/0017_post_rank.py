@@ -0,0 +1,97 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:24
+
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 1000
+
+
+def hot_score(moments):
+    # Формула posts.ranking на момент миграции: логарифм суммы exp(λ·t).
+    decay = math.log(2) / settings.RANK_HALF_LIFE
+    heats = [decay * (moment - EPOCH).total_seconds() for moment in moments]
+    top = max(heats)
+    return top + math.log(sum(math.exp(value - top) for value in heats))
+
+
+def fill_post_ranks(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    PostRank = apps.get_model('posts', 'PostRank')
+    posts = Post.objects.order_by('pk').values_list(
+        'pk', 'author_id', 'pub_date')
+    last = 0
+    # Пачками по диапазону id: в памяти только посты пачки и их
+    # комментарии.
+    while True:
+        batch = list(posts.filter(pk__gt=last)[:BATCH_SIZE])
+        if not batch:
+            return
+        last = batch[-1][0]
+        followers = dict(
+            Follow.objects.filter(
+                author_id__in={author_id for _, author_id, _ in batch})
+            .values('author').annotate(count=Count('pk'))
+            .values_list('author', 'count'))
+        comments = defaultdict(list)
+        for post_id, created in Comment.objects.filter(
+                post_id__gte=batch[0][0], post_id__lte=last
+        ).values_list('post_id', 'created').iterator():
+            comments[post_id].append(created)
+        PostRank.objects.bulk_create(
+            PostRank(
+                post_id=pk,
+                author_id=author_id,
+                hot=hot_score([pub_date, *comments[pk]]),
+                followers=followers.get(author_id, 0),
+            ) for pk, author_id, pub_date in batch
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_post_comment_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostRank',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('hot', models.FloatField(verbose_name='Горячесть')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков у автора')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг поста',
+                'verbose_name_plural': 'Рейтинги постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-comment_count', '-id'], name='post_comment_count_idx'),
+        ),
+        migrations.AddField(
+            model_name='postrank',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AddIndex(
+            model_name='postrank',
+            index=models.Index(fields=['-hot', '-post'], name='rank_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postrank',
+            index=models.Index(fields=['-followers', '-post'], name='rank_followers_idx'),
+        ),
+        migrations.RunPython(fill_post_ranks, migrations.RunPython.noop),
+    ]
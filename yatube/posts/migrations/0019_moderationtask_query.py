@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_timeline_entry_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moderationtask',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя пачка'),
+        ),
+        migrations.AddField(
+            model_name='moderationtask',
+            name='query',
+            field=models.BinaryField(help_text='Запрос из списка админки (pickle) вместо списка id', null=True, verbose_name='Отбор постов'),
+        ),
+    ]
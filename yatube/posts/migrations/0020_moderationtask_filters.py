@@ -0,0 +1,22 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_moderationtask_query'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='moderationtask',
+            name='query',
+        ),
+        migrations.AddField(
+            model_name='moderationtask',
+            name='filters',
+            field=models.TextField(blank=True, help_text='JSON с фильтрами списка постов вместо списка id', verbose_name='Фильтры'),
+        ),
+    ]
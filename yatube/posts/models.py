@@ -30,6 +30,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа подтягиваются одним JOIN."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -62,11 +68,59 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Денормализация: обновляется сигналами Comment через F(),
+    # расхождения правит manage.py reconcile_comment_counts.
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+    )
+    last_comment_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Последний комментарий',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('-last_comment_at', '-id'),
+                name='post_last_comment_idx'
+            ),
+            models.Index(
+                fields=('-comment_count', '-id'),
+                name='post_comment_count_idx'
+            ),
+        ]
+
+    def save(self, *args, update_fields=None, **kwargs):
+        # Полное сохранение существующего поста не должно затирать
+        # счётчик комментариев значением, прочитанным до правки.
+        if update_fields is None and not self._state.adding:
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ('comment_count', 'last_comment_at')
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
 
     def __str__(self):
         return self.text[:15]
@@ -98,6 +152,14 @@ class Comment(models.Model):
         help_text='Время создания комментария',
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text[:30]
 
@@ -119,10 +181,193 @@ class Follow(models.Model):
     )
 
     class Meta:
-        constraints = models.UniqueConstraint(
-            fields=('user', 'author'),
-            name='following'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='following'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='no_self_follow'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.post}'
+
+
+class PostRank(models.Model):
+    """Оценки поста для ранжированных лент (см. posts.ranking)."""
+    post = models.OneToOneField(
+        Post,
+        primary_key=True,
+        related_name='rank',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+    )
+    hot = models.FloatField(verbose_name='Горячесть')
+    followers = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков у автора',
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг поста'
+        verbose_name_plural = 'Рейтинги постов'
+        indexes = [
+            models.Index(fields=('-hot', '-post'), name='rank_hot_idx'),
+            models.Index(
+                fields=('-followers', '-post'),
+                name='rank_followers_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.hot:.2f}'
+
+
+class ModerationTask(models.Model):
+    """Массовая операция модератора, выполняемая в фоне (posts.moderation)."""
+    MOVE_TO_GROUP = 'move_to_group'
+    DELETE_POSTS = 'delete_posts'
+    DELETE_COMMENTS = 'delete_comments'
+    PURGE_IMAGES = 'purge_images'
+    ACTIONS = (
+        (MOVE_TO_GROUP, 'Перенос постов в группу'),
+        (DELETE_POSTS, 'Удаление постов авторов'),
+        (DELETE_COMMENTS, 'Удаление комментариев авторов'),
+        (PURGE_IMAGES, 'Удаление картинок постов'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    action = models.CharField(
+        max_length=32,
+        choices=ACTIONS,
+        verbose_name='Операция',
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    targets = models.TextField(
+        verbose_name='Объекты',
+        help_text='JSON-список id постов или авторов',
+    )
+    filters = models.TextField(
+        blank=True,
+        verbose_name='Фильтры',
+        help_text='JSON с фильтрами списка постов вместо списка id',
+    )
+    group = models.ForeignKey(
+        Group,
+        null=True,
+        blank=True,
+        related_name='+',
+        on_delete=models.SET_NULL,
+        verbose_name='Группа',
+    )
+    created_by = models.ForeignKey(
+        User,
+        null=True,
+        related_name='+',
+        on_delete=models.SET_NULL,
+        verbose_name='Модератор',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана',
+    )
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Завершена',
+    )
+    heartbeat = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последняя пачка',
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name='Всего')
+    processed = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Обработано',
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Задача модерации'
+        verbose_name_plural = 'Задачи модерации'
+
+    def __str__(self):
+        return f'{self.get_action_display()} ({self.get_status_display()})'
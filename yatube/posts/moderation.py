@@ -0,0 +1,201 @@
+"""Массовые операции модераторов (см. действия в ``posts.admin``).
+
+Действие админки только создаёт ``ModerationTask`` и ставит её в пул
+``core.background``; веб-воркер не ждёт обработки. Задача выполняется
+пачками по ``CHUNK_SIZE`` строк, каждая в своей короткой транзакции,
+поэтому таблица не блокируется надолго, а после каждой пачки в задаче
+обновляется счётчик ``processed`` — его показывает список задач в админке.
+
+Посты задачи — id отмеченных строк или, при «выбрать все», фильтры
+списка админки (``FILTERS``) в JSON: задача не раздувается списком id
+всей таблицы, а посты обходятся пачками по ``pk``. Пул живёт в процессе,
+поэтому после перезапуска
+``manage.py resume_moderation`` добирает задачи в очереди и брошенные.
+"""
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import background
+from posts import caching, counters, search, thumbnails
+from posts.models import Comment, ModerationTask, Post
+
+logger = logging.getLogger(__name__)
+CHUNK_SIZE = 500
+# Фильтры списка постов в админке, которые задача повторяет сама;
+# q — поиск по индексу (posts.search).
+FILTERS = {
+    'author': 'author__username',
+    'pub_date__gte': 'pub_date__gte',
+    'pub_date__lt': 'pub_date__lt',
+}
+SEARCH = 'q'
+
+
+def queue(action, targets=(), user=None, group=None, filters=None):
+    """Создаёт задачу и отправляет её в фоновую обработку.
+
+    ``targets`` — id постов или авторов, ``filters`` — вместо id постов
+    параметры из ``FILTERS`` и ``SEARCH``.
+    """
+    if filters is not None and not set(filters) <= {*FILTERS, SEARCH}:
+        raise ValueError(f'неизвестные фильтры: {sorted(filters)}')
+    task = ModerationTask.objects.create(
+        action=action,
+        targets=json.dumps(sorted(set(targets))),
+        filters='' if filters is None else json.dumps(filters),
+        group=group,
+        created_by=user,
+    )
+    background.submit(run, task.pk)
+    return task
+
+
+def _posts(task):
+    if not task.filters:
+        posts = Post.objects.filter(pk__in=json.loads(task.targets))
+    else:
+        filters = json.loads(task.filters)
+        posts = Post.objects.filter(**{
+            FILTERS[name]: value.strip()
+            for name, value in filters.items() if name in FILTERS
+        })
+        if filters.get(SEARCH):
+            posts = search.apply(posts, filters[SEARCH])
+    if task.action == ModerationTask.PURGE_IMAGES:
+        posts = posts.exclude(image='')
+    return posts
+
+
+def _chunks(task):
+    """id постов задачи пачками, по возрастанию pk."""
+    posts = _posts(task).order_by('pk')
+    last = 0
+    while True:
+        chunk = list(posts.filter(pk__gt=last).values_list(
+            'pk', flat=True)[:CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def _move_to_group(task, targets):
+    group_id = task.group_id
+    if group_id is None:
+        raise ValueError('целевая группа удалена')
+    for chunk in _chunks(task):
+        with transaction.atomic():
+            posts = list(
+                Post.objects.filter(pk__in=chunk)
+                .exclude(group_id=group_id)
+                .only('author_id', 'group_id')
+            )
+            Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+                group_id=group_id)
+        # update() обходит сигналы: побочные эффекты — как в post_saved.
+        for post in posts:
+            old_group_id, post.group_id = post.group_id, group_id
+            counters.post_moved(old_group_id, group_id)
+            caching.post_changed(post, old_group_id)
+        search.reindex(
+            Post.objects.filter(pk__in=[post.pk for post in posts]))
+        yield len(chunk)
+
+
+def _delete_by_author(model):
+    def delete(task, author_ids):
+        queryset = model.objects.filter(author_id__in=author_ids)
+        while True:
+            # Срез id вместо delete() по всему QuerySet: одна пачка —
+            # одна короткая транзакция, сигналы удаления срабатывают.
+            chunk = list(queryset.values_list('pk', flat=True)[:CHUNK_SIZE])
+            if not chunk:
+                return
+            with transaction.atomic():
+                model.objects.filter(pk__in=chunk).delete()
+            yield len(chunk)
+    return delete
+
+
+def _purge_images(task, targets):
+    for chunk in _chunks(task):
+        with transaction.atomic():
+            posts = list(
+                Post.objects.filter(pk__in=chunk).exclude(image='')
+                .only('image', 'author_id', 'group_id')
+            )
+            Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+                image='')
+        for post in posts:
+            name = post.image.name
+            thumbnails.remove(name)
+            default_storage.delete(name)
+            caching.post_changed(post)
+        yield len(chunk)
+
+
+def _total(task, targets):
+    if task.action == ModerationTask.DELETE_POSTS:
+        return Post.objects.filter(author_id__in=targets).count()
+    if task.action == ModerationTask.DELETE_COMMENTS:
+        return Comment.objects.filter(author_id__in=targets).count()
+    return _posts(task).count()
+
+
+HANDLERS = {
+    ModerationTask.MOVE_TO_GROUP: _move_to_group,
+    ModerationTask.DELETE_POSTS: _delete_by_author(Post),
+    ModerationTask.DELETE_COMMENTS: _delete_by_author(Comment),
+    ModerationTask.PURGE_IMAGES: _purge_images,
+}
+
+
+def run(task_id):
+    tasks = ModerationTask.objects.filter(pk=task_id)
+    # Условный UPDATE захватывает задачу: повторный запуск её пропустит.
+    if not tasks.filter(status=ModerationTask.PENDING).update(
+            status=ModerationTask.RUNNING, heartbeat=timezone.now()):
+        return
+    task = tasks.get()
+    targets = json.loads(task.targets)
+    # После перезапуска обработчики пропускают сделанное: счёт заново.
+    tasks.update(total=_total(task, targets), processed=0)
+    try:
+        for done in HANDLERS[task.action](task, targets):
+            tasks.update(
+                processed=F('processed') + done, heartbeat=timezone.now())
+    except Exception as error:
+        logger.exception('Задача модерации %s завершилась ошибкой', task_id)
+        tasks.update(
+            status=ModerationTask.FAILED, error=repr(error),
+            finished=timezone.now())
+        return
+    tasks.update(status=ModerationTask.DONE, finished=timezone.now())
+
+
+def resume(stale=None):
+    """Выполняет задачи в очереди и брошенные; вернёт их число.
+
+    Задача ``RUNNING`` без новой пачки дольше ``stale`` секунд
+    (``MODERATION_TASK_STALE``) осталась от остановленного процесса.
+    Обработчики пропускают уже сделанное, поэтому повтор безопасен.
+    """
+    if stale is None:
+        stale = settings.MODERATION_TASK_STALE
+    ModerationTask.objects.filter(
+        status=ModerationTask.RUNNING,
+        heartbeat__lt=timezone.now() - timedelta(seconds=stale),
+    ).update(status=ModerationTask.PENDING)
+    pending = list(ModerationTask.objects.filter(
+        status=ModerationTask.PENDING).order_by('pk').values_list(
+        'pk', flat=True))
+    for task_id in pending:
+        run(task_id)
+    return len(pending)
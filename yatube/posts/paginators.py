@@ -0,0 +1,221 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+from core import db
+
+FEED_ORDERING = ('-pub_date', '-pk')
+
+
+class CountedPaginator(Paginator):
+    """Нумерованная пагинация с заранее известным (кэшированным) count.
+
+    Срез страницы не зависит от count, поэтому отстающий счётчик
+    влияет только на ссылки навигации, но не на выдачу.
+    """
+
+    def __init__(self, object_list, per_page, count=None):
+        super().__init__(object_list, per_page)
+        if count is not None:
+            self.count = count
+
+    def page(self, number):
+        overflow = False
+        try:
+            number = self.validate_number(number)
+        except EmptyPage:
+            number = int(number)
+            if number < 1:
+                raise
+            overflow = True
+        bottom = (number - 1) * self.per_page
+        # Срез остаётся ленивым: при попадании во фрагментный кэш
+        # запрос страницы не выполняется вовсе.
+        object_list = self.object_list[bottom:bottom + self.per_page]
+        if overflow and not object_list:
+            raise EmptyPage('That page contains no results')
+        return self._get_page(object_list, number, self)
+
+
+def estimated_count(queryset):
+    """Приблизительное число строк таблицы без COUNT(*).
+
+    Оценка планировщика (``core.db.estimated_rows``), а без неё —
+    максимальный pk (поиск по индексу; удаления дают завышение).
+    """
+    model = queryset.model
+    estimate = db.estimated_rows(model, queryset.db)
+    if estimate is not None:
+        return estimate
+    if model._meta.pk.get_internal_type() not in (
+            'AutoField', 'BigAutoField'):
+        return None
+    return model._default_manager.using(queryset.db).aggregate(
+        last=Max('pk'))['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки: для нефильтрованной большой таблицы — оценка.
+
+    Точный COUNT(*) по миллионам строк — полный проход по индексу на
+    каждое открытие списка. Номера страниц при оценке приблизительны,
+    что для админки приемлемо; фильтрованные выборки и небольшие
+    таблицы считаются точно.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
+
+
+def elided_page_range(page_obj, on_each_side=2, on_ends=1, last=None):
+    """Номера страниц с многоточиями вместо полного page_range.
+
+    Номера дальше ``last`` (по умолчанию ``CURSOR_AFTER_PAGE``) и текущей
+    страницы не показываются: OFFSET туда дорог, дальше ведут курсоры.
+    """
+    if last is None:
+        last = settings.CURSOR_AFTER_PAGE
+    number = page_obj.number
+    num_pages = page_obj.paginator.num_pages
+    shown = min(num_pages, max(number, last))
+    if number > 1 + on_each_side + on_ends + 1:
+        pages = list(range(1, on_ends + 1)) + [None]
+        pages += list(range(number - on_each_side, number + 1))
+    else:
+        pages = list(range(1, number + 1))
+    pages += list(range(number + 1, min(number + on_each_side, shown) + 1))
+    if pages[-1] < num_pages:
+        pages.append(None)
+    return pages
+
+
+class CursorPage(Page):
+    """Страница ленты, адресуемая курсором вместо номера."""
+    cursor_mode = True
+
+    def __init__(self, object_list, paginator, cursor,
+                 next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page {self.cursor or "first"}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация: WHERE по ключу сортировки вместо OFFSET.
+
+    Стоимость страницы не зависит от её глубины и не требует COUNT(*).
+    Последнее поле ``ordering`` должно быть уникальным (обычно pk).
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = ordering
+
+    def _field(self, name):
+        opts = self.object_list.model._meta
+        name = name.lstrip('-')
+        if name == 'pk':
+            return opts.pk
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return opts.get_field(name)
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name in self.ordering:
+            value = getattr(obj, name.lstrip('-'))
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        payload = json.dumps([direction] + values).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, *raw = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in ('next', 'prev'):
+                return None
+            if len(raw) != len(self.ordering):
+                return None
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.ordering, raw)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+        # Столбцы сортировки не пустые, а с None ключ не построить.
+        if any(value is None for value in values):
+            return None
+        return direction, values
+
+    def _keyset_filter(self, values, backwards):
+        query = Q()
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith('-') != backwards
+            lookup = 'lt' if descending else 'gt'
+            condition = Q(**{f'{name.lstrip("-")}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(self.ordering[:i], values[:i]):
+                condition &= Q(**{prev_name.lstrip('-'): prev_value})
+            query |= condition
+        return query
+
+    def _slice(self, queryset, decoded):
+        """Строки за курсором (не больше страницы и одной лишней)."""
+        if decoded:
+            direction, values = decoded
+            backwards = direction == 'prev'
+            queryset = queryset.filter(
+                self._keyset_filter(values, backwards))
+            if backwards:
+                queryset = queryset.reverse()
+        return list(queryset[:self.per_page + 1])
+
+    def _rows(self, decoded):
+        return self._slice(self.object_list, decoded)
+
+    def page(self, cursor=None):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        backwards = decoded is not None and decoded[0] == 'prev'
+        rows = self._rows(decoded)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, decoded is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1], 'next')
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], 'prev')
+        return CursorPage(
+            rows, self, cursor, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        return self.page(cursor)
@@ -0,0 +1,172 @@
+"""Ранжированные ленты: «горячее», «обсуждаемое», «популярные авторы».
+
+Оценки хранятся в ``PostRank`` и обновляются по событиям, а не пересчётом
+всей таблицы при запросе:
+
+* ``hot`` — затухающая скорость комментариев. Каждое событие (публикация
+  поста, комментарий) весит ``exp(λ·t)``, где ``λ = ln 2 / RANK_HALF_LIFE``;
+  деление всех оценок на ``exp(λ·сейчас)`` порядок не меняет, поэтому
+  затухание не требует пересчёта. Сумма хранится в логарифме и
+  пополняется через ``logaddexp`` одним ``UPDATE`` с ``F()``.
+* ``followers`` — число подписчиков автора, копия на каждом его посте.
+* «Обсуждаемое» читается по ``Post.comment_count`` (см. ``posts.activity``).
+
+Каждая лента — индекс по ``(оценка, id)``, и страницы отдаёт тот же
+``paginator``, что и главную.
+"""
+import math
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+
+from core import background
+from posts import caching, counters
+from posts.models import Comment, Follow, Post, PostRank
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 1000
+RESCORE_KEY = 'posts:ranking:rescore:{}'
+# Если пересчёт потерян (падение процесса), пост снова пересчитается
+# не позже чем через столько секунд после следующего удаления.
+RESCORE_LOCK_TTL = 60
+FEEDS = {
+    'hot': 'Горячее',
+    'discussed': 'Обсуждаемое',
+    'popular': 'Популярные авторы',
+}
+
+
+def heat(moment):
+    """Логарифм веса события в момент ``moment``."""
+    decay = math.log(2) / settings.RANK_HALF_LIFE
+    return decay * (moment - EPOCH).total_seconds()
+
+
+def logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def hot_score(moments):
+    score = -math.inf
+    for moment in moments:
+        score = logaddexp(score, heat(moment))
+    return score
+
+
+def feed(name):
+    """QuerySet ленты и порядок для ``paginator``."""
+    posts = Post.objects.for_feed()
+    if name == 'discussed':
+        return posts, ('-comment_count', '-pk')
+    column = 'hot' if name == 'hot' else 'followers'
+    # Сортировка по столбцам PostRank целиком покрывается его индексом.
+    posts = posts.filter(rank__isnull=False).annotate(
+        score=F(f'rank__{column}'), rank_id=F('rank__post_id'))
+    return posts, ('-score', '-rank_id')
+
+
+def count(name):
+    """Число постов в ленте для номеров страниц."""
+    if name == 'discussed':
+        return counters.total_posts()
+    return counters.ranked_posts()
+
+
+def posts_created(posts):
+    posts = list(posts)
+    followers = {
+        author_id: counters.followers(author_id)
+        for author_id in {post.author_id for post in posts}
+    }
+    PostRank.objects.bulk_create(
+        (PostRank(
+            post_id=post.pk,
+            author_id=post.author_id,
+            hot=heat(post.pub_date),
+            followers=followers[post.author_id],
+        ) for post in posts),
+        ignore_conflicts=True,
+    )
+    caching.bump('ranked')
+
+
+def _add_event(score):
+    # logaddexp(hot, score) = max + ln(1 + exp(-|hot - score|)).
+    score = Value(score)
+    return Greatest(F('hot'), score) + Ln(1 + Exp(-Abs(F('hot') - score)))
+
+
+def comment_added(comment):
+    PostRank.objects.filter(post_id=comment.post_id).update(
+        hot=_add_event(heat(comment.created)))
+    caching.bump('ranked')
+
+
+def rescore(post_id):
+    """Считает ``hot`` поста заново (после удаления комментария)."""
+    # Снимаем отметку до чтения: удаление, закоммиченное позже, назначит
+    # новый пересчёт.
+    cache.delete(RESCORE_KEY.format(post_id))
+    post = Post.objects.filter(pk=post_id).only('pub_date').first()
+    if post is None:
+        return
+    moments = Comment.objects.filter(post_id=post_id).values_list(
+        'created', flat=True)
+    PostRank.objects.filter(post_id=post_id).update(
+        hot=hot_score([post.pub_date, *moments.iterator()]))
+    caching.bump('ranked')
+
+
+def _schedule_rescore(post_id):
+    if cache.add(RESCORE_KEY.format(post_id), True, RESCORE_LOCK_TTL):
+        background.submit(rescore, post_id)
+
+
+def comment_removed(comment):
+    # Вычитание в логарифмах неустойчиво: проще пересчитать пост.
+    # Массовое удаление даёт один пересчёт на пост, а не на комментарий:
+    # пока пересчёт ждёт в очереди, новые удаления его не дублируют.
+    # Отметка ставится после коммита, поэтому ожидающий пересчёт
+    # прочитает и это удаление.
+    background.submit(_schedule_rescore, comment.post_id)
+
+
+def _update_followers(author_id):
+    count = Follow.objects.filter(author_id=author_id).count()
+    PostRank.objects.filter(author_id=author_id).update(followers=count)
+    caching.bump('ranked')
+
+
+def followers_changed(author_id):
+    # Абсолютное значение вместо ±1: повтор или пропуск задачи
+    # исправляет следующая подписка автора.
+    background.submit(_update_followers, author_id)
+
+
+def rebuild():
+    """Пересобирает PostRank целиком (``manage.py rebuild_rankings``)."""
+    with transaction.atomic():
+        PostRank.objects.all().delete()
+        posts = Post.objects.only('pub_date', 'author_id').order_by('pk')
+        batch = []
+        for post in posts.iterator(chunk_size=BATCH_SIZE):
+            batch.append(post)
+            if len(batch) == BATCH_SIZE:
+                posts_created(batch)
+                batch = []
+        posts_created(batch)
+        # Комментарии идут по индексу (post, created) и складываются
+        # в оценку поста по одному, без загрузки всех в память.
+        comments = Comment.objects.filter(post__isnull=False).order_by(
+            'post_id', 'created').values_list('post_id', 'created')
+        for post_id, rows in groupby(
+                comments.iterator(chunk_size=BATCH_SIZE), itemgetter(0)):
+            PostRank.objects.filter(post_id=post_id).update(
+                hot=_add_event(hot_score(created for _, created in rows)))
@@ -0,0 +1,141 @@
+"""Полнотекстовый поиск по текстам постов и названиям групп.
+
+Индекс — отдельная таблица ``posts_search`` (см. миграцию 0014):
+
+* SQLite — виртуальная таблица FTS5, ``rowid`` совпадает с id поста.
+  FTS5 не знает русской морфологии, поэтому документ и запрос проходят
+  через ``posts.stemmer``.
+* PostgreSQL — ``tsvector`` с GIN-индексом, стемминг делает сам сервер
+  (конфигурация ``russian``).
+
+На прочих СУБД поиск деградирует до ``icontains``. Индекс обновляется
+сигналами ``Post`` и ``Group``; ``manage.py rebuild_search_index``
+пересобирает его целиком. На SQLite миграция только создаёт таблицу:
+посты, написанные до неё, индексирует эта команда.
+"""
+import re
+
+from django.db import connection
+
+from posts.models import Post
+from posts.stemmer import stem
+
+TABLE = 'posts_search'
+CONFIG = 'russian'
+BATCH_SIZE = 1000
+WORD = re.compile(r'\w+')
+
+
+def words(text):
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+def document(text, group_title=None):
+    """Текст, который попадает в индекс для поста."""
+    return ' '.join(filter(None, (text, group_title)))
+
+
+def _sqlite_document(text, group_title=None):
+    return ' '.join(words(document(text, group_title)))
+
+
+def _sqlite_match(query):
+    # Каждое слово в кавычках: операторы FTS5 из запроса не исполняются.
+    return ' '.join(f'"{word}"' for word in words(query))
+
+
+def enabled():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _rows(posts):
+    return [
+        (post.pk, post.text, post.group.title if post.group_id else None)
+        for post in posts
+    ]
+
+
+def index(posts):
+    """Добавляет или обновляет посты в индексе."""
+    if not enabled():
+        return
+    rows = _rows(posts)
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {TABLE} (rowid, body) '
+                f'VALUES (%s, %s)',
+                [(pk, _sqlite_document(text, title))
+                 for pk, text, title in rows],
+            )
+        else:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (post_id, document) '
+                f'VALUES (%s, to_tsvector(%s, %s)) '
+                f'ON CONFLICT (post_id) DO UPDATE '
+                f'SET document = EXCLUDED.document',
+                [(pk, CONFIG, document(text, title))
+                 for pk, text, title in rows],
+            )
+
+
+def remove(post_id):
+    if not enabled():
+        return
+    column = 'rowid' if connection.vendor == 'sqlite' else 'post_id'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE {column} = %s', [post_id])
+
+
+def reindex(queryset):
+    """Переиндексирует посты пачками, не загружая всё в память."""
+    queryset = queryset.select_related('group').only(
+        'text', 'group__title').order_by('pk')
+    batch = []
+    for post in queryset.iterator(chunk_size=BATCH_SIZE):
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            index(batch)
+            batch = []
+    index(batch)
+
+
+def rebuild():
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+    reindex(Post.objects.all())
+
+
+def _matching(queryset, subquery, params):
+    # RawSQL внутри pk__in получает вторые скобки, и SQLite читает
+    # «IN ((SELECT ...))» как скалярный подзапрос — нужен чистый IN.
+    column = '{}.{}'.format(
+        connection.ops.quote_name(Post._meta.db_table),
+        connection.ops.quote_name(Post._meta.pk.column),
+    )
+    return queryset.extra(where=[f'{column} IN ({subquery})'], params=params)
+
+
+def apply(queryset, query):
+    """Сужает QuerySet постов до найденных по запросу."""
+    if connection.vendor == 'sqlite':
+        match = _sqlite_match(query)
+        if not match:
+            return queryset.none()
+        return _matching(
+            queryset,
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [match])
+    if connection.vendor == 'postgresql':
+        return _matching(
+            queryset,
+            f'SELECT post_id FROM {TABLE} '
+            f'WHERE document @@ plainto_tsquery(%s, %s)', [CONFIG, query])
+    return queryset.filter(text__icontains=query)
+
+
+def search(query):
+    return apply(Post.objects.for_feed(), query)
@@ -0,0 +1,108 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from posts import (
+    activity, autocomplete, caching, counters, follows, ranking, search,
+    timeline,
+)
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._initial_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.post_added(instance.author_id, instance.group_id)
+        ranking.posts_created([instance])
+        if timeline.enabled():
+            timeline.fan_out(instance)
+    elif instance.group_id != instance._initial_group_id:
+        counters.post_moved(instance._initial_group_id, instance.group_id)
+    caching.post_changed(instance, instance._initial_group_id)
+    instance._initial_group_id = instance.group_id
+    search.index([instance])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_removed(instance.author_id, instance.group_id)
+    caching.post_changed(instance)
+    search.remove(instance.pk)
+
+
+@receiver(post_init, sender=Group)
+def remember_title(sender, instance, **kwargs):
+    instance._initial_title = instance.__dict__.get('title')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    caching.bump('index')
+    caching.bump('group', instance.pk)
+    if not created and instance.title != instance._initial_title:
+        # Название группы входит в документ поиска её постов.
+        search.reindex(instance.posts.all())
+    instance._initial_title = instance.title
+    caching.bump('choices', sender._meta.label_lower)
+    autocomplete.groups.update(instance)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    caching.bump('choices', sender._meta.label_lower)
+    autocomplete.groups.delete(instance.pk)
+
+
+# Поля пользователя, которые видны в подсказках.
+AUTOCOMPLETE_USER_FIELDS = {'username', 'is_active', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Вход сохраняет только last_login: индекс и его версия не меняются.
+    if update_fields is None or AUTOCOMPLETE_USER_FIELDS & update_fields:
+        autocomplete.users.update(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.users.delete(instance.pk)
+
+
+def _comment_post(comment):
+    # add_comment передаёт пост вместе с комментарием; при удалении
+    # его приходится читать (или пост уже удалён каскадом).
+    if Comment.post.is_cached(comment):
+        return comment.post
+    return Post.objects.filter(pk=comment.post_id).only(
+        'author_id', 'group_id').first()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        activity.comment_added(instance)
+        ranking.comment_added(instance)
+    caching.comment_changed(instance, _comment_post(instance))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    activity.comment_removed(instance)
+    ranking.comment_removed(instance)
+    caching.comment_changed(instance, _comment_post(instance))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        follows.on_follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follows.on_unfollow(instance.user_id, instance.author_id)
@@ -0,0 +1,66 @@
+"""Стеммер Snowball для русского языка.
+
+Используется поиском на SQLite: FTS5 не умеет стемминг русского, поэтому
+в индекс и в запрос попадают уже усечённые основы. Окончания ищутся
+только в области RV (после первой гласной), как в оригинальном алгоритме.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+RV = re.compile(rf'^(.*?[{VOWELS}])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|'
+    r'ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$')
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+# Словообразовательное окончание снимается только в R2.
+DERIVATIONAL = re.compile(rf'.*[^{VOWELS}]+[{VOWELS}].*ость?$')
+DERIVATIONAL_ENDING = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def _cut(pattern, word):
+    return pattern.sub('', word, 1)
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if match is None:
+        return word
+    start, rv = match.groups()
+    # Шаг 1.
+    cut = _cut(PERFECTIVE_GERUND, rv)
+    if cut != rv:
+        rv = cut
+    else:
+        rv = _cut(REFLEXIVE, rv)
+        cut = _cut(ADJECTIVE, rv)
+        if cut != rv:
+            rv = _cut(PARTICIPLE, cut)
+        else:
+            cut = _cut(VERB, rv)
+            rv = cut if cut != rv else _cut(NOUN, rv)
+    # Шаг 2.
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    # Шаг 3.
+    if DERIVATIONAL.match(rv):
+        rv = _cut(DERIVATIONAL_ENDING, rv)
+    # Шаг 4.
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _cut(SUPERLATIVE, rv)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return start + rv
@@ -0,0 +1,22 @@
+from django import template
+
+from posts import thumbnails
+from posts.paginators import elided_page_range as _elided_page_range
+
+register = template.Library()
+
+
+@register.simple_tag
+def elided_page_range(page_obj, on_each_side=2, on_ends=1):
+    return _elided_page_range(page_obj, on_each_side, on_ends)
+
+
+@register.simple_tag
+def post_picture(post):
+    return thumbnails.picture(post)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    thumbnails.prefetch(posts)
+    return ''
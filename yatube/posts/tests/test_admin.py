@@ -0,0 +1,197 @@
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Max
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import moderation
+from posts.models import Comment, Group, ModerationTask, Post
+from posts.paginators import EstimatedCountPaginator
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21'
+    b'\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00'
+    b'\x01\x00\x00\x02\x01\x00\x00\x3b'
+)
+
+
+class AdminPerformanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.author = User.objects.create(username='author')
+        cls.other = User.objects.create(username='other')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author) for i in range(30))
+        post = Post.objects.create(text='Чужой пост', author=cls.other)
+        Comment.objects.create(post=post, author=cls.other, text='Текст')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse(f'admin:posts_{model}_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_unfiltered_count_is_estimated(self):
+        with mock.patch.object(EstimatedCountPaginator, 'threshold', 10):
+            response, queries = self.changelist('post')
+        last = Post.objects.aggregate(last=Max('pk'))['last']
+        self.assertEqual(response.context['cl'].result_count, last)
+        self.assertFalse(any('COUNT(' in sql for sql in queries))
+
+    def test_small_table_count_is_exact(self):
+        response, _ = self.changelist('post')
+        self.assertEqual(
+            response.context['cl'].result_count, Post.objects.count())
+
+    def test_author_filter(self):
+        response, _ = self.changelist('post', author='other')
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, reverse('posts:user_suggestions'))
+        response, _ = self.changelist('comment', author='author')
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_no_distinct_date_scan(self):
+        _, queries = self.changelist('post')
+        self.assertFalse(any('DISTINCT' in sql for sql in queries))
+
+    def test_query_count_does_not_depend_on_rows(self):
+        _, before = self.changelist('post')
+        user = User.objects.create(username='new')
+        Post.objects.bulk_create(
+            Post(text='Ещё', author=user) for _ in range(10))
+        _, after = self.changelist('post')
+        self.assertEqual(len(before), len(after))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_SYNC=True)
+class ModerationActionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.spammer = User.objects.create(username='spammer')
+        cls.author = User.objects.create(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.spam = Post.objects.create(text='Спам', author=self.spammer)
+        Post.objects.create(text='Ещё спам', author=self.spammer)
+        self.post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(
+            post=self.post, author=self.spammer, text='Спам')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Ответ')
+
+    def apply(self, model, action, objects, query='', **data):
+        return self.client.post(
+            reverse(f'admin:posts_{model}_changelist') + query,
+            {'action': action, '_selected_action': [o.pk for o in objects],
+             **data},
+            follow=True,
+        )
+
+    def test_move_to_group(self):
+        response = self.apply(
+            'post', 'move_to_group', [self.spam, self.post],
+            group=self.group.pk)
+        self.assertContains(response, 'поставлена в очередь')
+        self.assertEqual(self.group.posts.count(), 2)
+        task = ModerationTask.objects.get()
+        self.assertEqual(task.status, ModerationTask.DONE)
+        self.assertEqual((task.processed, task.total), (2, 2))
+
+    def test_select_across_stores_filter(self):
+        with mock.patch.object(moderation.background, 'submit'):
+            self.apply('post', 'move_to_group', [self.spam],
+                       query='?author=spammer', select_across='1',
+                       group=self.group.pk)
+        task = ModerationTask.objects.get()
+        self.assertEqual(task.targets, '[]')
+        self.assertEqual(json.loads(task.filters), {'author': 'spammer'})
+        with mock.patch.object(moderation, 'CHUNK_SIZE', 1):
+            self.assertEqual(moderation.resume(), 1)
+        self.assertEqual(
+            set(self.group.posts.values_list('author__username', flat=True)),
+            {'spammer'})
+        task.refresh_from_db()
+        self.assertEqual((task.processed, task.total), (2, 2))
+
+    def test_select_across_rejects_unknown_filters(self):
+        response = self.apply(
+            'post', 'purge_images', [self.spam],
+            query='?group__id__exact=1', select_across='1')
+        self.assertContains(response, 'недоступно')
+        self.assertFalse(ModerationTask.objects.exists())
+
+    def test_resume_restarts_stale_tasks(self):
+        with mock.patch.object(moderation.background, 'submit'):
+            self.apply('post', 'delete_posts_by_author', [self.spam])
+        task = ModerationTask.objects.get()
+        ModerationTask.objects.update(
+            status=ModerationTask.RUNNING, heartbeat=timezone.now())
+        call_command('resume_moderation', stdout=io.StringIO())
+        task.refresh_from_db()
+        self.assertEqual(task.status, ModerationTask.RUNNING)
+        call_command('resume_moderation', stale=0, stdout=io.StringIO())
+        task.refresh_from_db()
+        self.assertEqual(task.status, ModerationTask.DONE)
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+
+    def test_move_requires_group(self):
+        self.apply('post', 'move_to_group', [self.spam])
+        self.assertFalse(ModerationTask.objects.exists())
+
+    def test_delete_by_author(self):
+        with mock.patch.object(moderation, 'CHUNK_SIZE', 1):
+            self.apply('post', 'delete_posts_by_author', [self.spam])
+        self.assertEqual(list(Post.objects.all()), [self.post])
+        self.assertEqual(
+            ModerationTask.objects.get().processed, 2)
+        self.apply('comment', 'delete_comments_by_author',
+                   Comment.objects.filter(author=self.author))
+        self.assertFalse(Comment.objects.filter(author=self.author).exists())
+
+    def test_task_progress_page(self):
+        self.apply('post', 'delete_comments_by_author', [self.spam])
+        task = ModerationTask.objects.get()
+        response = self.client.get(
+            reverse('admin:posts_moderationtask_change', args=(task.pk,)))
+        self.assertContains(response, '<progress value="1" max="1">')
+
+    def test_purge_images(self):
+        self.post.image = SimpleUploadedFile('spam.gif', SMALL_GIF)
+        self.post.save()
+        name = self.post.image.name
+        self.assertTrue(default_storage.exists(name))
+        self.apply('post', 'purge_images', [self.post, self.spam])
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.image)
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(ModerationTask.objects.get().total, 1)
@@ -1,10 +1,17 @@
+import io
 import shutil
 import tempfile
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 from yatube.settings import BASE_DIR
+from posts import uploads
+from posts.forms import PostForm
 from posts.models import Group, Post, Comment
 
 User = get_user_model()
@@ -62,6 +69,8 @@ class PostFormsTests(TestCase):
         self.assertEqual(form_data['text'], 'Данные из формы')
         self.assertEqual(form_data['image'], uploaded)
         self.assertIs(Post.objects.count(), post_count + 1)
+        self.assertTrue(
+            Post.objects.filter(image='posts/small.gif').exists())
         self.assertRedirects(response, reverse(
             'posts:profile',
             kwargs={'username': self.user.username}))
@@ -91,6 +100,43 @@ class PostFormsTests(TestCase):
             'posts:post_detail', kwargs={'post_id': post.pk}))
 
 
+class GroupChoicesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='User')
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}') for i in range(50))
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def group_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse('posts:post_create'))
+        return [
+            query for query in queries.captured_queries
+            if 'posts_group' in query['sql']
+        ]
+
+    def test_choices_are_cached(self):
+        Group.objects.create(title='Новая', slug='new')
+        self.assertEqual(len(self.group_queries()), 1)
+        self.assertEqual(self.group_queries(), [])
+        choices = list(PostForm().fields['group'].choices)
+        self.assertEqual(len(choices), 52)
+        self.assertIn(('', '---------'), choices)
+
+    def test_choices_follow_group_changes(self):
+        self.group_queries()
+        group = Group.objects.create(title='Новая', slug='new')
+        self.assertIn(
+            (group.pk, 'Новая'), PostForm().fields['group'].choices)
+        group.delete()
+        self.assertNotIn(
+            (group.pk, 'Новая'), PostForm().fields['group'].choices)
+
+
 class CommentTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -124,3 +170,44 @@ class CommentTests(TestCase):
         self.assertRedirects(response, reverse(
             'posts:post_detail',
             kwargs={'post_id': self.post.pk}))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_UPLOAD_MAX_SIDE=50)
+class ImageUploadTests(TestCase):
+    @staticmethod
+    def make_jpeg(size=(200, 100)):
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_large_image_is_downsampled_without_metadata(self):
+        result = uploads.process(self.make_jpeg())
+        image = Image.open(result)
+        self.assertEqual(image.size, (50, 25))
+        self.assertEqual(dict(image.getexif()), {})
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_oversized_file_is_rejected(self):
+        form = PostForm(
+            data={'text': 'Текст'}, files={'image': self.make_jpeg()})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(IMAGE_UPLOAD_MAX_FULL_PIXELS=1000)
+    def test_full_decode_formats_have_lower_limit(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (200, 100)).save(buffer, 'PNG')
+        png = SimpleUploadedFile(
+            'image.png', buffer.getvalue(), content_type='image/png')
+        with self.assertRaises(ValidationError):
+            uploads.inspect(png)
+        self.assertEqual(uploads.inspect(self.make_jpeg()).format, 'JPEG')
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000)
+    def test_too_many_pixels_is_rejected(self):
+        form = PostForm(
+            data={'text': 'Текст'}, files={'image': self.make_jpeg()})
+        self.assertFalse(form.is_valid())
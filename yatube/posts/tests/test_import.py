@@ -0,0 +1,129 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from yatube.settings import BASE_DIR
+from posts import counters
+from posts.models import Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_SYNC=True)
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir)
+
+    def write(self, name, content):
+        path = os.path.join(self.workdir, name)
+        with open(path, 'w', encoding='utf-8') as target:
+            target.write(content)
+        return path
+
+    def test_jsonl_import_keeps_dates_and_images(self):
+        with open(os.path.join(self.workdir, 'pic.gif'), 'wb') as image:
+            image.write(SMALL_GIF)
+        self.assertEqual(counters.author_posts(self.user.pk), 0)
+        rows = [
+            {'author': 'author', 'text': 'Первый', 'group': 'group',
+             'pub_date': '2015-03-01T10:00:00', 'image': 'pic.gif'},
+            {'author': 'author', 'text': 'Второй'},
+            {'author': 'nobody', 'text': 'Пропущенный'},
+        ]
+        path = self.write(
+            'posts.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        call_command(
+            'import_posts', path, batch_size=2, images_dir=self.workdir,
+            stdout=io.StringIO(), stderr=io.StringIO())
+        first = Post.objects.get(text='Первый')
+        self.assertEqual(first.pub_date.year, 2015)
+        self.assertEqual(first.group, self.group)
+        self.assertTrue(first.image.name.startswith('posts/pic'))
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(counters.author_posts(self.user.pk), 2)
+
+    def test_impossible_date_skips_row(self):
+        path = self.write('posts.jsonl', '\n'.join(json.dumps(row) for row in [
+            {'author': 'author', 'text': 'Плохая дата',
+             'pub_date': '2023-02-30T10:00:00'},
+            {'author': 'author', 'text': 'Хорошая дата',
+             'pub_date': '2023-02-28T10:00:00'},
+        ]))
+        stderr = io.StringIO()
+        call_command(
+            'import_posts', path, stdout=io.StringIO(), stderr=stderr)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)),
+            ['Хорошая дата'])
+        self.assertIn('2023-02-30', stderr.getvalue())
+
+    def test_csv_import_creates_users(self):
+        path = self.write(
+            'posts.csv', 'author,text,group\nnewbie,Из CSV,\n')
+        call_command(
+            'import_posts', path, create_users=True,
+            stdout=io.StringIO())
+        post = Post.objects.get(text='Из CSV')
+        self.assertEqual(post.author.username, 'newbie')
+        self.assertIsNone(post.group)
+
+
+class ExportDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.create(author=cls.staff, text='Пост', group=cls.group)
+        Post.objects.create(author=cls.staff, text='Без группы')
+
+    def test_command_writes_jsonl(self):
+        out = io.StringIO()
+        call_command('export_data', 'posts', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [(row['author'], row['text'], row['group']) for row in rows],
+            [('staff', 'Пост', 'group'), ('staff', 'Без группы', None)],
+        )
+
+    def test_endpoint_streams_csv_for_staff_only(self):
+        url = reverse('posts:export_data', kwargs={'dataset': 'groups'})
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(
+            content.splitlines(),
+            ['id,title,slug,description',
+             f'{self.group.pk},Группа,group,Описание'],
+        )
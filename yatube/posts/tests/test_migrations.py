@@ -0,0 +1,72 @@
+from importlib import import_module
+from unittest import mock
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+from posts import ranking
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Данные создаются на схеме ``before`` и проверяются после ``after``."""
+    before = after = None
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+
+class FollowConstraintsMigrationTests(MigrationTestCase):
+    before = [('posts', '0012_feed_indexes')]
+    after = [('posts', '0013_follow_constraints')]
+
+    def test_duplicate_and_self_follows_are_removed(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        Follow = apps.get_model('posts', 'Follow')
+        reader = User.objects.create(username='reader')
+        author = User.objects.create(username='author')
+        first = Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=author, author=author)
+        other = Follow.objects.create(user=author, author=reader)
+        apps = self.migrate(self.after)
+        Follow = apps.get_model('posts', 'Follow')
+        self.assertEqual(
+            sorted(Follow.objects.values_list('pk', flat=True)),
+            [first.pk, other.pk])
+
+
+class PostRankMigrationTests(MigrationTestCase):
+    before = [('posts', '0016_post_comment_activity')]
+    after = [('posts', '0017_post_rank')]
+
+    def test_ranks_are_filled_in_batches(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        Post = apps.get_model('posts', 'Post')
+        Comment = apps.get_model('posts', 'Comment')
+        Follow = apps.get_model('posts', 'Follow')
+        reader = User.objects.create(username='reader')
+        author = User.objects.create(username='author')
+        Follow.objects.create(user=reader, author=author)
+        posts = [Post.objects.create(text=f'Пост {number}', author=author)
+                 for number in range(3)]
+        for post in posts[1:]:
+            Comment.objects.create(post=post, author=reader, text='Текст')
+        migration = import_module('posts.migrations.0017_post_rank')
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            apps = self.migrate(self.after)
+        PostRank = apps.get_model('posts', 'PostRank')
+        for post in posts:
+            rank = PostRank.objects.get(post_id=post.pk)
+            moments = [post.pub_date, *Comment.objects.filter(
+                post_id=post.pk).values_list('created', flat=True)]
+            self.assertAlmostEqual(rank.hot, ranking.hot_score(moments))
+            self.assertEqual(rank.followers, 1)
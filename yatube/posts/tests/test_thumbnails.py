@@ -0,0 +1,115 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from yatube.settings import BASE_DIR
+from posts import thumbnails, variants
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_SYNC=True)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='User')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_page_uses_ready_thumbnail(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Текст',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        cache.set(thumbnails._key('feed', post.image.name), {
+            'url': '/media/cache/ready.gif', 'width': 960, 'height': 339,
+        }, None)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '/media/cache/ready.gif')
+        self.assertNotContains(response, 'aspect-ratio: 960 / 339')
+
+    def test_failed_generation_does_not_break_edit(self):
+        post = Post.objects.create(author=self.user, text='Текст')
+        with self.assertLogs('core.background', 'ERROR'):
+            thumbnails.background.submit(int, 'не число')
+        response = self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={
+                'text': 'Текст',
+                'image': SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, content_type='image/gif'),
+            },
+        )
+        self.assertRedirects(
+            response,
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+
+    def test_prefetch_reads_page_in_one_batch(self):
+        posts = [
+            Post.objects.create(
+                author=self.user,
+                text=f'Текст {i}',
+                image=SimpleUploadedFile(
+                    f'small{i}.gif', SMALL_GIF, content_type='image/gif'),
+            )
+            for i in range(3)
+        ]
+        ready = {'url': '/media/cache/ready.gif', 'width': 960, 'height': 339}
+        cache.set(thumbnails._key('feed', posts[0].image.name), ready, None)
+        thumbnails.prefetch(posts)
+        # После prefetch lookup берёт значения с объектов, а не из кэша.
+        cache.clear()
+        self.assertEqual(thumbnails.lookup(posts[0]), ready)
+        self.assertIsNone(thumbnails.lookup(posts[1]))
+
+    def test_responsive_variants(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Текст',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        thumbnails.generate_variants(post.pk)
+        for ext in variants.formats():
+            for width in (320, 640, 960):
+                self.assertTrue(default_storage.exists(
+                    variants.path(post.image.name, width, ext)))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(
+            response, variants.path(post.image.name, 320, 'jpg') + ' 320w')
+
+    @override_settings(BACKGROUND_TASKS_SYNC=False)
+    def test_page_shows_placeholder_until_ready(self):
+        Post.objects.create(
+            author=self.user,
+            text='Текст',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertNotContains(response, '<img class="card-img')
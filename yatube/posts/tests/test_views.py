@@ -1,11 +1,31 @@
+import base64
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.core.cache import cache
 from django import forms
-from yatube.settings import NUM_POST
-from posts.models import Post, Group, User, Follow
+from django.utils import timezone
+from core import writebehind
+from yatube.settings import NUM_COMMENTS, NUM_POST
+from posts.models import (
+    Comment, Post, PostRank, Group, User, Follow, TimelineEntry,
+)
+from posts import (
+    autocomplete, caching, comments, counters, follows, ranking, search,
+    timeline,
+)
+from posts.paginators import CursorPaginator, elided_page_range
 
 User = get_user_model()
 post_paginator = 13
@@ -180,10 +200,7 @@ class TaskPagesTests(TestCase):
         self.authorized_client.get(reverse('posts:index'))
         post = Post.objects.create(text="Очищение кэша", author=self.user)
         response2 = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotIn(post.text, response2.content.decode())
-        cache.clear()
-        response3 = self.authorized_client.get(reverse('posts:index'))
-        self.assertIn(post.text, response3.content.decode())
+        self.assertIn(post.text, response2.content.decode())
 
 
 class TaskPagesTests(TestCase):
@@ -286,3 +303,710 @@ class FollowTests(TestCase):
         follow.delete()
         response_2 = self.follower_client.get(reverse('posts:follow_index'))
         self.assertEqual(len(response_2.context['page_obj']), 0)
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='User')
+        for post in range(post_paginator):
+            Post.objects.create(author=cls.user, text=f'Пост {post}')
+
+    def test_cursor_pages(self):
+        response = self.client.get(reverse('posts:index') + '?cursor=')
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), NUM_POST)
+        self.assertFalse(first_page.has_previous())
+        response = self.client.get(
+            reverse('posts:index') + f'?cursor={first_page.next_cursor}')
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), post_paginator - NUM_POST)
+        self.assertFalse(second_page.has_next())
+        response = self.client.get(
+            reverse('posts:index')
+            + f'?cursor={second_page.previous_cursor}')
+        self.assertEqual(
+            list(response.context['page_obj']), list(first_page))
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.client.get(reverse('posts:index') + '?cursor=abc')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), NUM_POST)
+        self.assertEqual(page_obj[0], Post.objects.latest('pub_date', 'pk'))
+        cursor = base64.urlsafe_b64encode(
+            json.dumps(['next', None, None]).encode()).decode()
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': cursor})
+        self.assertEqual(response.context['page_obj'][0], page_obj[0])
+        post = response.context['page_obj'][0]
+        response = self.client.get(
+            reverse('posts:post_comments', args=(post.pk,)),
+            {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+
+class PostCountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='User')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='slug',
+            description='Описание группы',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_follow_post_changes(self):
+        self.assertEqual(counters.author_posts(self.user.pk), 0)
+        self.assertEqual(counters.group_posts(self.group.pk), 0)
+        post = Post.objects.create(author=self.user, text='Текст')
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.author_posts(self.user.pk), 1)
+        post.group = self.group
+        post.save()
+        self.assertEqual(counters.group_posts(self.group.pk), 1)
+        post.delete()
+        self.assertEqual(counters.author_posts(self.user.pk), 0)
+        self.assertEqual(counters.group_posts(self.group.pk), 0)
+
+    def test_elided_page_range(self):
+        for post in range(NUM_POST * 20):
+            Post.objects.create(author=self.user, text='Текст')
+        # Дальние номера (и «Последняя») не ссылаются на глубокий OFFSET.
+        for page, expected in (
+            (1, [1, 2, 3, None]),
+            (4, [1, 2, 3, 4, 5, None]),
+            (10, [1, None, 8, 9, 10, None]),
+        ):
+            response = self.client.get(
+                reverse('posts:index'), {'page': page})
+            self.assertEqual(
+                elided_page_range(response.context['page_obj']), expected)
+        self.assertNotContains(response, 'page=20')
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='slug',
+            description='Описание группы',
+        )
+        for number in range(NUM_POST):
+            author = User.objects.create(username=f'author_{number}')
+            cls.post = Post.objects.create(
+                author=author,
+                text='Текст поста',
+                group=cls.group,
+            )
+
+    def test_feed_query_budget(self):
+        # Бюджет не зависит от числа постов на странице: группа или
+        # автор, счётчики при холодном кэше и выборка постов; у страницы
+        # поста — первая страница комментариев вместе с авторами.
+        pages = {
+            reverse('posts:index'): 2,
+            reverse('posts:group_list', kwargs={'slug': 'slug'}): 3,
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.post.author.username}
+            ): 5,
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': self.post.pk}
+            ): 3,
+        }
+        for url, budget in pages.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    self.client.get(url)
+
+
+@override_settings(FOLLOW_TIMELINE=True, BACKGROUND_TASKS_SYNC=True)
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='user')
+        cls.author = User.objects.create(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def get_feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_timeline_follows_subscriptions(self):
+        old_post = Post.objects.create(author=self.author, text='Старый')
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.get_feed(), [new_post, old_post])
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_on_demand(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_pages_merge_popular_authors(self):
+        popular = User.objects.create(username='popular')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=popular)
+        Follow.objects.create(user=self.author, author=popular)
+        with override_settings(TIMELINE_FANOUT_LIMIT=2):
+            cache.clear()
+            for number in range(NUM_POST + 3):
+                Post.objects.create(
+                    author=(self.author, popular)[number % 2],
+                    text=f'Пост {number}')
+            expected = list(Post.objects.filter(
+                author__following__user=self.user
+            ).order_by('-pub_date', '-pk'))
+            first = self.client.get(reverse('posts:follow_index'))
+            page = first.context['page_obj']
+            second = self.client.get(
+                reverse('posts:follow_index'), {'cursor': page.next_cursor})
+        self.assertEqual(
+            list(page) + list(second.context['page_obj']), expected)
+        self.assertFalse(second.context['page_obj'].has_next())
+
+    def test_author_becoming_popular_is_not_shown_twice(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.assertEqual(timeline.popular_authors(), set())
+        with override_settings(TIMELINE_FANOUT_LIMIT=1):
+            # Пока прежние записи не удалены, их отсекает чтение.
+            cache.set(timeline.POPULAR_AUTHORS_KEY, {self.author.pk}, None)
+            self.assertEqual(self.get_feed(), [post])
+            cache.set(timeline.POPULAR_AUTHORS_KEY, set(), None)
+            timeline.refresh_popular_authors()
+            self.assertEqual(timeline.popular_authors(), {self.author.pk})
+        self.assertFalse(TimelineEntry.objects.exists())
+        with override_settings(TIMELINE_FANOUT_LIMIT=1):
+            self.assertEqual(self.get_feed(), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_authors_refresh_in_background(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(timeline.popular_authors(), {self.author.pk})
+        cache.delete(timeline.POPULAR_FRESH_KEY)
+        with mock.patch.object(timeline.background, 'submit') as submit:
+            with self.assertNumQueries(0):
+                # Пока список пересчитывается, действует прежний.
+                self.assertEqual(
+                    timeline.popular_authors(), {self.author.pk})
+                timeline.popular_authors()
+        submit.assert_called_once_with(timeline.refresh_popular_authors)
+
+    def test_entries_are_read_by_index_range(self):
+        plan = TimelineEntry.objects.filter(user=self.user).order_by(
+            *timeline.ORDERING)[:NUM_POST + 1].explain()
+        self.assertIn('timeline_user_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='user')
+        cls.authors = [
+            User.objects.create(username=f'author_{number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_follow_is_unique(self):
+        author = self.authors[0]
+        self.assertTrue(follows.follow(self.user, author))
+        self.assertFalse(follows.follow(self.user, author))
+        self.assertFalse(follows.follow(self.user, self.user))
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_follow_many_and_counts(self):
+        author_ids = [author.pk for author in self.authors]
+        self.assertEqual(follows.following_count(self.user), 0)
+        follows.follow_many(self.user, author_ids[:2])
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                follows.following_ids(self.user, author_ids),
+                set(author_ids[:2]),
+            )
+        self.assertEqual(follows.following_count(self.user), 2)
+        self.assertEqual(follows.followers_count(self.authors[0]), 1)
+        follows.unfollow_many(self.user, author_ids)
+        self.assertEqual(follows.following_count(self.user), 0)
+        self.assertFalse(Follow.objects.exists())
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='User')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='slug',
+            description='Описание группы',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Текст поста',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_are_served_from_cache_until_write(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'slug'}),
+            reverse('posts:profile', kwargs={'username': 'User'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            self.client.get(url)
+        # update() не шлёт сигналов: страницы остаются в кэше.
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+        for url in urls:
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                self.assertIn('Текст поста', content)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                self.assertIn('Новый текст', content)
+
+    def test_cached_index_skips_post_query(self):
+        self.client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('posts:index'))
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Путешествия', slug='travel', description='')
+        cls.book = Post.objects.create(
+            author=cls.user, text='Прочитал интересные книги о море')
+        cls.trip = Post.objects.create(
+            author=cls.user, text='Поездка на Байкал', group=cls.group)
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_uses_russian_stemming(self):
+        self.assertEqual(self.found('интересная книга'), [self.book.pk])
+        self.assertEqual(self.found('книга самолёт'), [])
+
+    def test_search_matches_group_title(self):
+        self.assertEqual(self.found('путешествие'), [self.trip.pk])
+        self.group.title = 'Поездки'
+        self.group.save()
+        self.assertEqual(self.found('путешествие'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.book.pk)
+        post.text = 'Про горы'
+        post.save()
+        self.assertEqual(self.found('книги'), [])
+        self.assertEqual(self.found('горы'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found('горы'), [])
+
+    def test_paginator_keeps_query(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Море {i}')
+            for i in range(NUM_POST))
+        search.rebuild()
+        response = self.client.get(reverse('posts:search'), {'q': 'море'})
+        self.assertContains(
+            response, 'href="?q=%D0%BC%D0%BE%D1%80%D0%B5&amp;page=2"')
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create(
+            username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'книгами'})
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [self.book.pk])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='Путешествия по России', slug='travel', description='')
+        User.objects.create(username='traveller', first_name='Иван')
+
+    def suggest(self, name, query):
+        response = self.client.get(
+            reverse(f'posts:{name}_suggestions'), {'q': query})
+        return response.json()['results']
+
+    def test_groups_by_title_word_and_slug(self):
+        expected = [{'id': self.group.pk, 'title': 'Путешествия по России',
+                     'slug': 'travel'}]
+        self.assertEqual(self.suggest('group', 'росс'), expected)
+        self.assertEqual(self.suggest('group', 'TRA'), expected)
+        self.assertEqual(self.suggest('group', 'мор'), [])
+
+    def test_local_changes_do_not_query_database(self):
+        self.suggest('group', 'пу')
+        group = Group.objects.create(title='Путь', slug='way', description='')
+        with self.assertNumQueries(0):
+            titles = [item['title'] for item in self.suggest('group', 'пут')]
+        self.assertEqual(titles, ['Путешествия по России', 'Путь'])
+        group.delete()
+        self.assertEqual(len(self.suggest('group', 'пут')), 1)
+
+    def test_other_process_change_triggers_rebuild(self):
+        self.suggest('user', 'tr')
+        User.objects.filter(username='traveller').update(is_active=False)
+        caching.bump('autocomplete', 'users')
+        self.assertEqual(self.suggest('user', 'tr'), [])
+
+    def test_users(self):
+        self.assertEqual(
+            self.suggest('user', 'Trav'),
+            [{'username': 'traveller', 'name': 'Иван'}])
+
+    def test_login_keeps_version(self):
+        version = caching.version('autocomplete', 'users')
+        self.client.force_login(User.objects.get(username='traveller'))
+        self.assertEqual(caching.version('autocomplete', 'users'), version)
+
+    def test_update_leaves_taken_snapshot_intact(self):
+        self.suggest('group', 'пу')
+        entries, items = autocomplete.groups._ensure()
+        before, pk = list(entries), self.group.pk
+        self.group.delete()
+        self.assertEqual(entries, before)
+        self.assertIn(pk, items)
+        self.assertEqual(self.suggest('group', 'пут'), [])
+
+
+class PostCommentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(NUM_COMMENTS + 5))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_in_context(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        page = response.context['comments']
+        self.assertEqual(len(page['results']), NUM_COMMENTS)
+        self.assertEqual(page['results'][0]['text'], 'Комментарий 0')
+        self.assertEqual(page['results'][0]['author']['username'], 'reader')
+        self.assertContains(response, 'Показать ещё')
+
+    def test_load_more(self):
+        first = comments.page(self.post.pk)
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            {'cursor': first['next']})
+        data = response.json()
+        self.assertEqual(
+            [item['text'] for item in data['results']],
+            [f'Комментарий {i}' for i in range(
+                NUM_COMMENTS, NUM_COMMENTS + 5)])
+        self.assertIsNone(data['next'])
+
+    def test_first_page_cached_until_new_comment(self):
+        comments.page(self.post.pk)
+        with self.assertNumQueries(0):
+            comments.page(self.post.pk)
+        Comment.objects.filter(text='Комментарий 0').delete()
+        self.assertEqual(
+            comments.page(self.post.pk)['results'][0]['text'],
+            'Комментарий 1')
+
+    def test_unknown_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk + 1,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentActivityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        Post.objects.create(text='Без комментариев', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def comment(self, text='Комментарий'):
+        self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': text})
+        return Comment.objects.latest('created')
+
+    def test_counts_follow_comments(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        first = self.comment()
+        second = self.comment()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.comment_count, 2)
+        self.assertEqual(post.last_comment_at, second.created)
+        # Правка поста, прочитанного до комментариев, не сбрасывает их.
+        stale.text = 'Правка'
+        stale.save()
+        second.delete()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(
+            (post.text, post.comment_count, post.last_comment_at),
+            ('Правка', 1, first.created))
+
+    def test_feed_shows_count(self):
+        self.client.get(reverse('posts:index'))
+        self.comment()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_reconcile(self):
+        comment = self.comment()
+        Post.objects.update(comment_count=5, last_comment_at=None)
+        out = StringIO()
+        call_command('reconcile_comment_counts', stdout=out)
+        self.assertIn('Исправлено постов: 2', out.getvalue())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(
+            (post.comment_count, post.last_comment_at),
+            (1, comment.created))
+        out = StringIO()
+        call_command('reconcile_comment_counts', stdout=out)
+        self.assertIn('Исправлено постов: 0', out.getvalue())
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True)
+class RankedFeedsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.star = User.objects.create(username='star')
+        cls.reader = User.objects.create(username='reader')
+        cls.old = Post.objects.create(text='Старый', author=cls.star)
+        cls.new = Post.objects.create(text='Новый', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self, name, **params):
+        response = self.client.get(reverse(f'posts:{name}'), params)
+        return response.context['page_obj']
+
+    def test_hot_follows_comments(self):
+        self.assertEqual(list(self.feed('hot')), [self.new, self.old])
+        comment = Comment.objects.create(
+            post=self.old, author=self.reader, text='Обсуждение')
+        expected = ranking.logaddexp(
+            ranking.heat(self.old.pub_date), ranking.heat(comment.created))
+        self.assertAlmostEqual(self.old.rank.hot, expected)
+        self.assertEqual(list(self.feed('hot')), [self.old, self.new])
+        self.assertEqual(list(self.feed('discussed')), [self.old, self.new])
+        comment.delete()
+        self.assertEqual(list(self.feed('hot')), [self.new, self.old])
+
+    def test_popular_follows_subscriptions(self):
+        Follow.objects.create(user=self.reader, author=self.star)
+        self.assertEqual(list(self.feed('popular')), [self.old, self.new])
+        Follow.objects.all().delete()
+        self.assertEqual(list(self.feed('popular')), [self.new, self.old])
+
+    def test_cached_pages_follow_new_posts_and_comments(self):
+        for name in ('hot', 'discussed', 'popular'):
+            self.client.get(reverse(f'posts:{name}'))
+        Post.objects.create(text='Свежий пост', author=self.author)
+        for name in ('hot', 'discussed', 'popular'):
+            self.assertContains(
+                self.client.get(reverse(f'posts:{name}')), 'Свежий пост')
+        before = self.client.get(reverse('posts:discussed')).content
+        Comment.objects.create(
+            post=self.old, author=self.reader, text='Обсуждение')
+        self.assertNotEqual(
+            self.client.get(reverse('posts:discussed')).content, before)
+
+    def test_filtered_feed_counts_ranked_posts(self):
+        PostRank.objects.filter(post=self.old).delete()
+        self.assertEqual(self.feed('hot').paginator.count, 1)
+        self.assertEqual(self.feed('discussed').paginator.count, 2)
+
+    def test_follow_many_updates_popular(self):
+        follows.follow_many(self.reader, [self.star.pk])
+        self.assertEqual(PostRank.objects.get(post=self.old).followers, 1)
+        self.assertEqual(list(self.feed('popular')), [self.old, self.new])
+
+    def test_removed_comments_rescore_post_once(self):
+        with mock.patch.object(ranking.background, 'submit') as submit:
+            for _ in range(3):
+                ranking._schedule_rescore(self.old.pk)
+        submit.assert_called_once_with(ranking.rescore, self.old.pk)
+        ranking.rescore(self.old.pk)
+        with mock.patch.object(ranking.background, 'submit') as submit:
+            ranking._schedule_rescore(self.old.pk)
+        submit.assert_called_once()
+
+    def test_cursor_pages(self):
+        for number in range(NUM_POST):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        posts, ordering = ranking.feed('hot')
+        first = CursorPaginator(posts, NUM_POST, ordering).page()
+        second = self.feed('hot', cursor=first.next_cursor)
+        self.assertEqual(list(second), [self.new, self.old])
+
+    def test_rebuild_matches_incremental_scores(self):
+        Comment.objects.create(post=self.new, author=self.reader, text='1')
+        Comment.objects.create(post=self.new, author=self.reader, text='2')
+        Follow.objects.create(user=self.reader, author=self.author)
+        before = list(PostRank.objects.order_by('pk').values_list(
+            'post', 'hot', 'followers'))
+        ranking.rebuild()
+        after = list(PostRank.objects.order_by('pk').values_list(
+            'post', 'hot', 'followers'))
+        self.assertEqual(len(before), len(after))
+        for (post, hot, followers), expected in zip(after, before):
+            self.assertEqual((post, followers), expected[::2])
+            self.assertAlmostEqual(hot, expected[1])
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True)
+class WriteBehindTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader')
+        cls.author = User.objects.create(username='writer')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.journal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal)
+        settings = override_settings(
+            WRITE_BEHIND=True, WRITE_BEHIND_JOURNAL=self.journal)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def journal_size(self):
+        return sum(
+            os.path.getsize(os.path.join(self.journal, name))
+            for name in os.listdir(self.journal))
+
+    def test_comment_is_written_on_flush(self):
+        self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Отложенный'})
+        self.assertFalse(Comment.objects.exists())
+        writebehind.flush()
+        comment = Comment.objects.get()
+        self.assertEqual(
+            (comment.post_id, comment.author_id, comment.text),
+            (self.post.pk, self.user.pk, 'Отложенный'))
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comment_count, 1)
+        self.assertEqual(self.journal_size(), 0)
+
+    def test_batch_keeps_order(self):
+        for view in ('profile_follow', 'profile_unfollow', 'profile_follow'):
+            self.client.get(reverse(f'posts:{view}', args=('writer',)))
+        self.client.get(reverse('posts:profile_unfollow', args=('writer',)))
+        self.client.get(reverse('posts:profile_follow', args=('writer',)))
+        writebehind.flush()
+        self.assertTrue(follows.is_following(self.user, self.author))
+        self.assertEqual(counters.followers(self.author.pk), 1)
+
+    def test_bad_entry_does_not_drop_batch(self):
+        writebehind.submit('unknown', 1)
+        follows.follow(self.user, self.author)
+        with self.assertLogs('core.writebehind', 'ERROR'):
+            writebehind.flush()
+        self.assertTrue(follows.is_following(self.user, self.author))
+
+    def test_recover_replays_dead_process_journal(self):
+        queued = timezone.now().isoformat()
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Уже в базе')
+        process = subprocess.Popen(['true'])
+        process.wait()
+        owner = f'{process.pid}-{uuid.uuid4().hex}'
+        segments = [
+            [['comment',
+              [self.post.pk, self.user.pk, 'Уже в базе', queued]]],
+            [['comment', [self.post.pk, self.user.pk, 'Новый', queued]],
+             ['follow', [self.user.pk, self.author.pk]]],
+        ]
+        for number, entries in enumerate(segments):
+            path = os.path.join(self.journal, f'{owner}-{number}.journal')
+            with open(path, 'w', encoding='utf-8') as journal:
+                for entry in entries:
+                    journal.write(json.dumps(entry) + '\n')
+        with open(path, 'a', encoding='utf-8') as journal:
+            # Запись, оборванная падением, не была подтверждена.
+            journal.write('["unfollow", [')
+        self.assertEqual(writebehind.recover(), 3)
+        self.assertEqual(
+            sorted(Comment.objects.values_list('text', flat=True)),
+            ['Новый', 'Уже в базе'])
+        self.assertTrue(follows.is_following(self.user, self.author))
+        self.assertEqual(os.listdir(self.journal), [])
+
+    def test_applied_segments_are_removed(self):
+        with override_settings(WRITE_BEHIND_SEGMENT_SIZE=1):
+            follows.follow(self.user, self.author)
+            writebehind._write_journal()
+            follows.unfollow(self.user, self.author.pk)
+            writebehind._write_journal()
+            self.assertEqual(len(os.listdir(self.journal)), 2)
+            writebehind._apply_ready()
+        self.assertEqual(os.listdir(self.journal), [])
+        self.assertFalse(follows.is_following(self.user, self.author))
+
+    def test_recover_skips_own_journal_only(self):
+        follows.follow(self.user, self.author)
+        writebehind._write_journal()
+        # Журнал прежнего процесса, получившего тот же pid.
+        path = os.path.join(
+            self.journal, f'{os.getpid()}-{uuid.uuid4().hex}-0.journal')
+        with open(path, 'w', encoding='utf-8') as journal:
+            journal.write(json.dumps(
+                ['follow', [self.author.pk, self.user.pk]]) + '\n')
+        self.assertEqual(writebehind.recover(), 1)
+        self.assertTrue(follows.is_following(self.author, self.user))
+        self.assertFalse(follows.is_following(self.user, self.author))
+        self.assertEqual(len(os.listdir(self.journal)), 1)
+        writebehind._apply_ready()
+        self.assertTrue(follows.is_following(self.user, self.author))
@@ -0,0 +1,123 @@
+"""Фоновая генерация миниатюр постов.
+
+Миниатюры всех зарегистрированных размеров строятся пулом
+``core.background`` при создании или правке поста с картинкой. Шаблоны
+только читают готовый результат из кэша (``lookup``) и, пока его нет,
+показывают заглушку — запрос страницы никогда не обрабатывает картинку.
+Рядом с миниатюрами sorl строятся адаптивные варианты (``posts.variants``)
+под псевдонимом ``RESPONSIVE``.
+"""
+import hashlib
+
+from django.core.cache import cache
+from sorl.thumbnail import delete, get_thumbnail
+
+from core import background
+from posts import caching, variants
+from posts.models import Post
+
+SIZES = {}
+RESPONSIVE = 'responsive'
+PENDING_TTL = 60
+
+
+def register(alias, geometry, **options):
+    SIZES[alias] = (geometry, options)
+
+
+register('feed', '960x339', crop='center', upscale=True)
+
+
+def _key(alias, name):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return f'posts:thumbnail:{alias}:{digest}'
+
+
+def generate(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id').first()
+    if post is None or not post.image:
+        return
+    for alias, (geometry, options) in SIZES.items():
+        thumbnail = get_thumbnail(post.image.name, geometry, **options)
+        cache.set(_key(alias, post.image.name), {
+            'url': thumbnail.url,
+            'width': thumbnail.width,
+            'height': thumbnail.height,
+        }, None)
+    # Страницы с заглушкой могли попасть во фрагментный кэш.
+    caching.post_changed(post)
+
+
+def generate_variants(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id').first()
+    if post is None or not post.image:
+        return
+    cache.set(
+        _key(RESPONSIVE, post.image.name), variants.build(post.image.name),
+        None)
+    caching.post_changed(post)
+
+
+def schedule(post):
+    if post.image and cache.add(
+            _key('pending', post.image.name), True, PENDING_TTL):
+        background.submit(generate, post.pk)
+        background.submit(generate_variants, post.pk)
+
+
+def remove(name):
+    """Удаляет миниатюры и варианты картинки вместе с записями в кэше."""
+    delete(name, delete_file=False)
+    variants.remove(name)
+    cache.delete_many(
+        [_key(alias, name) for alias in (*SIZES, RESPONSIVE, 'pending')])
+
+
+def lookup(post, alias='feed'):
+    """Готовая миниатюра или None; отсутствующую ставит в очередь."""
+    if not post.image:
+        return None
+    prefetched = getattr(post, '_prefetched_thumbnails', {})
+    if alias in prefetched:
+        thumbnail = prefetched[alias]
+    else:
+        thumbnail = cache.get(_key(alias, post.image.name))
+    if thumbnail is None:
+        schedule(post)
+    return thumbnail
+
+
+def prefetch(posts, aliases=('feed', RESPONSIVE)):
+    """Читает миниатюры страницы постов одним ``cache.get_many``.
+
+    Результат запоминается на самих объектах, и последующие ``lookup``
+    для них не обращаются к кэшу.
+    """
+    posts = [post for post in posts if post.image]
+    keys = {
+        (post.pk, alias): _key(alias, post.image.name)
+        for post in posts for alias in aliases
+    }
+    found = cache.get_many(set(keys.values()))
+    for post in posts:
+        if not hasattr(post, '_prefetched_thumbnails'):
+            post._prefetched_thumbnails = {}
+        for alias in aliases:
+            post._prefetched_thumbnails[alias] = found.get(
+                keys[post.pk, alias])
+
+
+def picture(post):
+    """Данные для ``<picture>``: адаптивные источники и запасной ``<img>``.
+
+    Пока варианты не готовы, в ``<img>`` идёт обычная миниатюра ленты.
+    """
+    responsive = lookup(post, RESPONSIVE)
+    if responsive is not None:
+        return responsive
+    thumbnail = lookup(post)
+    if thumbnail is None:
+        return None
+    return dict(thumbnail, sources=[])
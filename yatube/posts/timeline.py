@@ -0,0 +1,169 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается в ``TimelineEntry`` каждого подписчика, и лента
+``/follow/`` читается одним диапазоном по индексу
+``(user, pub_date, post)``. Посты популярных авторов (подписчиков не
+меньше ``TIMELINE_FANOUT_LIMIT``) не раскладываются, а подмешиваются при
+чтении (fan-out on read) запросом по индексу каждого такого автора.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from core import background
+from posts.models import Follow, Post, TimelineEntry
+from posts.paginators import CursorPaginator
+
+POPULAR_AUTHORS_KEY = 'posts:timeline:popular'
+POPULAR_FRESH_KEY = 'posts:timeline:popular:fresh'
+POPULAR_REFRESH_LOCK = 'posts:timeline:popular:refresh'
+BATCH_SIZE = 1000
+ORDERING = ('-pub_date', '-post_id')
+
+
+def enabled():
+    return settings.FOLLOW_TIMELINE
+
+
+def popular_authors():
+    """Множество id авторов, чьи посты не раскладываются по лентам.
+
+    Список пересчитывается в фоне раз в ``TIMELINE_POPULAR_TTL``; до
+    этого запросы читают прежний, не дожидаясь GROUP BY по подпискам.
+    """
+    if cache.get(POPULAR_FRESH_KEY) is None and cache.add(
+            POPULAR_REFRESH_LOCK, True, settings.TIMELINE_POPULAR_TTL):
+        background.submit(refresh_popular_authors)
+    return cache.get(POPULAR_AUTHORS_KEY) or set()
+
+
+def refresh_popular_authors():
+    authors = set(
+        Follow.objects.values('author')
+        .annotate(followers=Count('id'))
+        .filter(followers__gte=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('author', flat=True)
+    )
+    previous = cache.get(POPULAR_AUTHORS_KEY) or set()
+    cache.set(POPULAR_AUTHORS_KEY, authors, None)
+    cache.set(POPULAR_FRESH_KEY, True, settings.TIMELINE_POPULAR_TTL)
+    cache.delete(POPULAR_REFRESH_LOCK)
+    # Посты ставшего популярным автора теперь читаются отдельным потоком,
+    # а разложенные раньше записи только занимают место.
+    if authors - previous:
+        TimelineEntry.objects.filter(
+            author_id__in=authors - previous).delete()
+    # Посты, вышедшие пока автор был популярным, не попали в ленты:
+    # при выходе из списка раскладываем их подписчикам.
+    for author_id in previous - authors:
+        follower_ids = Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True)
+        for user_id in follower_ids.iterator():
+            _backfill(user_id, author_id)
+
+
+def _entries(post, user_ids):
+    return (
+        TimelineEntry(
+            user_id=user_id,
+            author_id=post.author_id,
+            post_id=post.pk,
+            pub_date=post.pub_date,
+        )
+        for user_id in user_ids
+    )
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post):
+    if post.author_id in popular_authors():
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert(_entries(post, follower_ids.iterator()))
+
+
+def _backfill(user_id, author_id):
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author_id', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL]
+    _bulk_insert(
+        entry for post in posts for entry in _entries(post, [user_id]))
+
+
+def backfill(user_id, author_id):
+    """Переносит последние посты автора в ленту нового подписчика."""
+    if author_id not in popular_authors():
+        _backfill(user_id, author_id)
+
+
+def remove(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    TimelineEntry.objects.all().delete()
+    cache.delete(POPULAR_AUTHORS_KEY)
+    refresh_popular_authors()
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорные страницы ленты из нескольких упорядоченных потоков.
+
+    Каждый поток читается не дальше страницы за курсором, ключи
+    ``(pub_date, post_id)`` сливаются в Python, а посты страницы
+    загружаются одним запросом по id.
+    """
+
+    def __init__(self, entries, streams, per_page):
+        super().__init__(entries, per_page, ORDERING)
+        self.streams = [stream.order_by(*ORDERING) for stream in streams]
+
+    def _rows(self, decoded):
+        rows = self._slice(self.object_list, decoded)
+        for stream in self.streams:
+            rows += self._slice(stream, decoded)
+        backwards = decoded is not None and decoded[0] == 'prev'
+        rows.sort(
+            key=lambda row: (row.pub_date, row.post_id),
+            reverse=not backwards)
+        return rows[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        page = super().page(cursor)
+        posts = Post.objects.for_feed().in_bulk(
+            [row.post_id for row in page.object_list])
+        page.object_list = [
+            posts[row.post_id] for row in page.object_list
+            if row.post_id in posts
+        ]
+        return page
+
+
+def page(user, cursor=None):
+    """Страница ленты подписок по курсору."""
+    entries = TimelineEntry.objects.filter(user=user).only(
+        'pub_date', 'post_id')
+    popular = popular_authors()
+    followed_popular = list(Follow.objects.filter(
+        user=user, author_id__in=popular
+    ).values_list('author_id', flat=True)) if popular else []
+    if followed_popular:
+        # Эти посты придут из потоков авторов: записи, оставшиеся с тех
+        # пор, как автор не был популярным, задвоили бы их.
+        entries = entries.exclude(author_id__in=followed_popular)
+    streams = [
+        Post.objects.filter(author_id=author_id).annotate(
+            post_id=F('pk')).only('pub_date')
+        for author_id in followed_popular
+    ]
+    return TimelinePaginator(entries, streams, settings.NUM_POST).page(
+        cursor)
@@ -0,0 +1,98 @@
+"""Обработка загруженных картинок с ограниченным расходом памяти.
+
+Загрузки крупнее ``FILE_UPLOAD_MAX_MEMORY_SIZE`` Django пишет на диск
+кусками, и картинка открывается по пути к временному файлу. Ограничения
+проверяются по заголовку, до декодирования пикселей. Крупные JPEG
+декодируются сразу в уменьшенном масштабе (``draft``); остальные форматы
+декодируются целиком, и для них действует меньший предел пикселей.
+При пересохранении метаданные (EXIF, GPS) отбрасываются.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 85},
+    'GIF': {},
+}
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'GIF': 'image/gif',
+}
+
+
+def _open(upload):
+    if hasattr(upload, 'temporary_file_path'):
+        return Image.open(upload.temporary_file_path())
+    upload.seek(0)
+    return Image.open(upload)
+
+
+def inspect(upload):
+    """Проверяет размер файла и заголовок картинки без её декодирования."""
+    limit = settings.IMAGE_UPLOAD_MAX_BYTES
+    if upload.size > limit:
+        raise ValidationError(
+            f'Файл больше {limit // 2 ** 20} МБ.', code='file_too_large')
+    try:
+        # Image.open читает только заголовок.
+        image = _open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Загрузите корректное изображение.', code='invalid_image')
+    if image.format not in SAVE_OPTIONS:
+        raise ValidationError(
+            'Поддерживаются JPEG, PNG, WebP и GIF.', code='invalid_format')
+    width, height = image.size
+    # Только JPEG декодируется в уменьшенном масштабе (см. process).
+    limit = (
+        settings.IMAGE_UPLOAD_MAX_PIXELS if image.format == 'JPEG'
+        else settings.IMAGE_UPLOAD_MAX_FULL_PIXELS)
+    if width * height > limit:
+        raise ValidationError(
+            'Слишком большое разрешение изображения.', code='too_many_pixels')
+    return image
+
+
+def process(upload):
+    """Уменьшает картинку до ``IMAGE_UPLOAD_MAX_SIDE`` и убирает метаданные.
+
+    Возвращает новый временный файл с тем же именем.
+    Анимированные картинки только проверяются.
+    """
+    image = inspect(upload)
+    if getattr(image, 'is_animated', False):
+        return upload
+    image_format = image.format
+    side = settings.IMAGE_UPLOAD_MAX_SIDE
+    width, height = image.size
+    ratio = side / max(width, height)
+    if ratio < 1:
+        target = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        # JPEG декодируется сразу в масштабе 1/2..1/8, не меньше целевого.
+        image.draft(image.mode, target)
+        image.thumbnail(target, Image.LANCZOS)
+    image = ImageOps.exif_transpose(image)
+    # Результат тоже не держится в памяти целиком: крупный сбрасывается
+    # во временный файл.
+    buffer = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    options = dict(SAVE_OPTIONS[image_format])
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(buffer, image_format, **options)
+    size = buffer.tell()
+    buffer.seek(0)
+    return UploadedFile(
+        buffer, os.path.basename(upload.name), CONTENT_TYPES[image_format],
+        size)
@@ -5,6 +5,15 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('hot/', views.ranked_posts, {'name': 'hot'}, name='hot'),
+    path('discussed/',
+         views.ranked_posts,
+         {'name': 'discussed'},
+         name='discussed'),
+    path('popular/',
+         views.ranked_posts,
+         {'name': 'popular'},
+         name='popular'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
@@ -13,6 +22,9 @@ urlpatterns = [
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
          views.profile_follow,
@@ -20,4 +32,12 @@ urlpatterns = [
     path('profile/<str:username>/unfollow/',
          views.profile_unfollow,
          name='profile_unfollow'),
+    path('search/', views.post_search, name='search'),
+    path('autocomplete/groups/',
+         views.group_suggestions,
+         name='group_suggestions'),
+    path('autocomplete/users/',
+         views.user_suggestions,
+         name='user_suggestions'),
+    path('export/<str:dataset>/', views.export_data, name='export_data'),
 ]
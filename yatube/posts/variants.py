@@ -0,0 +1,85 @@
+"""Адаптивные варианты картинок постов для ``<picture>``/``srcset``.
+
+Каждая картинка кадрируется до пропорций ленты и сохраняется в нескольких
+ширинах и форматах. Путь варианта зависит только от имени исходного файла,
+ширины и формата (``posts/variants/<md5>/<ширина>.<расширение>``), поэтому
+файлы может отдавать фронтовой прокси без обращения к приложению.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+ASPECT = (960, 339)
+# Расширение, MIME-тип, формат Pillow, параметры кодировщика.
+FORMATS = {
+    # Скорость кодировщиков ниже максимальной: выигрыш в размере
+    # не окупает кратно большего времени генерации.
+    'avif': ('image/avif', 'AVIF', {'quality': 50, 'speed': 8}),
+    'webp': ('image/webp', 'WEBP', {'quality': 75, 'method': 4}),
+    'jpg': ('image/jpeg', 'JPEG', {'quality': 82, 'optimize': True,
+                                   'progressive': True}),
+}
+FALLBACK = 'jpg'
+
+
+def formats():
+    """Включённые форматы, которые умеет кодировать установленный Pillow.
+
+    JPEG всегда последний: это запасной ``<img>`` для старых браузеров.
+    """
+    enabled = [
+        ext for ext in settings.IMAGE_VARIANT_FORMATS
+        if ext != FALLBACK and features.check(FORMATS[ext][1].lower())
+    ]
+    return enabled + [FALLBACK]
+
+
+def path(name, width, ext):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return f'posts/variants/{digest}/{width}.{ext}'
+
+
+def remove(name):
+    """Удаляет файлы всех вариантов картинки."""
+    for ext in FORMATS:
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            default_storage.delete(path(name, width, ext))
+
+
+def _height(width):
+    return round(width * ASPECT[1] / ASPECT[0])
+
+
+def build(name):
+    """Создаёт недостающие файлы вариантов и возвращает их описание."""
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    image = ImageOps.fit(image, ASPECT, Image.LANCZOS)
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    sources = []
+    for ext in formats():
+        mime, pil_format, options = FORMATS[ext]
+        srcset = []
+        for width in widths:
+            variant = path(name, width, ext)
+            if not default_storage.exists(variant):
+                buffer = io.BytesIO()
+                image.resize((width, _height(width)), Image.LANCZOS).save(
+                    buffer, pil_format, **options)
+                default_storage.save(variant, ContentFile(buffer.getvalue()))
+            srcset.append(f'{default_storage.url(variant)} {width}w')
+        sources.append({'type': mime, 'srcset': ', '.join(srcset)})
+    largest = widths[-1]
+    return {
+        # Последний источник (JPEG) уходит в сам <img>.
+        'sources': sources[:-1],
+        'url': default_storage.url(path(name, largest, FALLBACK)),
+        'srcset': sources[-1]['srcset'],
+        'width': largest,
+        'height': _height(largest),
+    }
@@ -1,73 +1,169 @@
+from urllib.parse import urlencode
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from yatube.settings import NUM_POST
-from posts.models import Post, Group, User, Follow
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from core.db import replica_reads
+from yatube.settings import NUM_POST, CURSOR_AFTER_PAGE
+from posts.models import Post, Group, User
 from posts.forms import PostForm, CommentForm
-
-
-def paginator(request, post_list):
-    paginator = Paginator(post_list, NUM_POST)
+from posts.paginators import CountedPaginator, CursorPaginator, FEED_ORDERING
+from posts import (
+    autocomplete, caching, comments, counters, export, follows, ranking,
+    search, thumbnails, timeline,
+)
+
+
+def paginator(request, post_list, ordering=FEED_ORDERING, count=None):
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        return CursorPaginator(post_list, NUM_POST, ordering).page(cursor)
+    paginator = CountedPaginator(
+        post_list.order_by(*ordering), NUM_POST, count=count)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    if page_obj.number >= CURSOR_AFTER_PAGE and page_obj.has_next():
+        # Глубже номерных страниц лента листается курсором без OFFSET.
+        page_obj.next_cursor = CursorPaginator(
+            post_list, NUM_POST, ordering
+        ).encode_cursor(page_obj[len(page_obj) - 1], 'next')
     return page_obj
 
 
+@replica_reads
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    page_obj = paginator(request=request, post_list=post_list)
+    post_list = Post.objects.for_feed()
+    page_obj = paginator(
+        request=request,
+        post_list=post_list,
+        count=counters.total_posts(),
+    )
     context = {
         'page_obj': page_obj,
+        **caching.fragment(request, 'index'),
     }
     return render(request, template, context)
 
 
+@replica_reads
+def ranked_posts(request, name):
+    template = 'posts/ranked.html'
+    post_list, ordering = ranking.feed(name)
+    page_obj = paginator(
+        request=request,
+        post_list=post_list,
+        ordering=ordering,
+        count=ranking.count(name),
+    )
+    context = {
+        'page_obj': page_obj,
+        'ranking': name,
+        'title': ranking.FEEDS[name],
+        # Одна версия на все ранжированные ленты: её и сбрасывают
+        # ranking и caching.post_changed; путь в ключе различает ленты.
+        **caching.fragment(request, 'ranked'),
+    }
+    return render(request, template, context)
+
+
+@replica_reads
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     template = 'posts/group_list.html'
-    post_list = group.posts.all()
-    page_obj = paginator(request=request, post_list=post_list)
+    post_list = group.posts.for_feed()
+    page_obj = paginator(
+        request=request,
+        post_list=post_list,
+        count=counters.group_posts(group.pk),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
-        'post_list': post_list
+        'post_list': post_list,
+        **caching.fragment(request, 'group', group.pk),
     }
     return render(request, template, context)
 
 
+@replica_reads
 def profile(request, username):
     template = 'posts/profile.html'
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = paginator(request=request, post_list=post_list)
+    post_list = author.posts.for_feed()
+    posts_count = counters.author_posts(author.pk)
+    page_obj = paginator(
+        request=request,
+        post_list=post_list,
+        count=posts_count,
+    )
     context = {
         'username': username,
         'page_obj': page_obj,
         'author': author,
+        'posts_count': posts_count,
+        'following': follows.is_following(request.user, author),
+        'followers_count': follows.followers_count(author),
+        'following_count': follows.following_count(author),
+        **caching.fragment(request, 'author', author.pk),
     }
     return render(request, template, context)
 
 
+@replica_reads
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comment = post.comments.all()
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
     context = {
         'post': post,
-        'comment': comment,
+        'comments': comments.page(post.pk),
         'form': CommentForm(),
+        'posts_count': counters.author_posts(post.author_id),
+        **caching.fragment(request, 'post', post.pk),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@replica_reads
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return JsonResponse(comments.page(post_id, request.GET.get('cursor')))
+
+
+@replica_reads
+def post_search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    post_list = search.search(query) if query else Post.objects.none()
+    context = {
+        'page_obj': paginator(request, post_list),
+        'query': query,
+        'paginator_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, template, context)
+
+
+def group_suggestions(request):
+    results = autocomplete.groups.search(request.GET.get('q', ''))
+    return JsonResponse({'results': results})
+
+
+def user_suggestions(request):
+    results = autocomplete.users.search(request.GET.get('q', ''))
+    return JsonResponse({'results': results})
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', request.user)
     return render(request, template, {'form': form})
 
@@ -84,6 +180,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post.pk,)
     context = {'form': form, 'is_edit': True}
     return render(request, 'posts/create_post.html', context)
@@ -97,36 +195,45 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        comments.add(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@replica_reads
 @login_required
 def follow_index(request):
-    post_list = Post.objects.select_related(
-        'author', 'group').filter(author__following__user=request.user)
-    context = {'page_obj': paginator(request, post_list)}
+    if timeline.enabled():
+        page_obj = timeline.page(request.user, request.GET.get('cursor'))
+    else:
+        page_obj = paginator(request, Post.objects.for_feed().filter(
+            author__following__user=request.user))
+    context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    following = Follow.objects.filter(
-        author=author,
-        user=request.user)
-    if request.user != author and not following:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author
-        )
+    follows.follow(request.user, author)
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    filt = Follow.objects.filter(
-        user=request.user, author__username=username)
-    if filt.exists():
-        filt.delete()
+    author = get_object_or_404(User, username=username)
+    follows.unfollow(request.user, author.pk)
     return redirect('posts:profile', username)
+
+
+@staff_member_required
+def export_data(request, dataset):
+    file_format = request.GET.get('format', 'jsonl')
+    if dataset not in export.DATASETS or file_format not in export.FORMATS:
+        raise Http404
+    response = StreamingHttpResponse(
+        export.lines(dataset, file_format),
+        content_type=export.FORMATS[file_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{dataset}.{file_format}"')
+    return response
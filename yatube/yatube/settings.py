@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -46,6 +47,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,6 +78,71 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами воркера: не платим за
+        # открытие файла и PRAGMA на каждый запрос.
+        'CONN_MAX_AGE': int(os.getenv('YATUBE_DB_CONN_MAX_AGE', 60)),
+    }
+}
+# Применяются к каждому новому соединению SQLite (core.db.configure_sqlite).
+# WAL: читатели не блокируют писателя и наоборот; NORMAL в режиме WAL
+# не портит базу при сбое, теряя лишь последние транзакции при отключении
+# питания; busy_timeout (мс) — сколько писатель ждёт чужую запись.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 20_000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 2 ** 20,
+    'temp_store': 'MEMORY',
+}
+# Реплики для чтения лент (см. core.db): YATUBE_DB_REPLICAS — пути к
+# копиям SQLite-базы через запятую (обновляет manage.py sync_replicas).
+# Реплики PostgreSQL описываются здесь же с тем же ENGINE, что у default.
+for number, name in enumerate(
+        filter(None, os.getenv('YATUBE_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# Приложения, чьи модели читаются с реплик. Сессии, пользователи и
+# contenttypes всегда из default: реплика SQLite может не знать
+# свежую сессию, и клиент оказался бы разлогинен.
+REPLICA_APPS = ['posts']
+# Сколько секунд после своей записи клиент читает только из default.
+REPLICA_PIN_SECONDS = 10
+
+
+# Бэкенд кэша выбирается окружением: locmem (по умолчанию), file,
+# sqlite (общий для воркеров файл без сервера), memcached или redis.
+# Все варианты из core.cache_backends считают попадания и промахи.
+CACHE_BACKENDS = {
+    'locmem': ('core.cache_backends.LocMemCache', 'yatube'),
+    'file': (
+        'core.cache_backends.FileBasedCache',
+        os.path.join(BASE_DIR, 'cache'),
+    ),
+    'sqlite': (
+        'core.cache_backends.SQLiteCache',
+        os.path.join(BASE_DIR, 'cache.sqlite3'),
+    ),
+    'memcached': ('core.cache_backends.MemcachedCache', '127.0.0.1:11211'),
+    'redis': ('core.cache_backends.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_CLIENTS = {'redis': 'django_redis', 'memcached': 'memcache'}
+CACHE_BACKEND = os.getenv('YATUBE_CACHE', 'locmem')
+if CACHE_BACKEND in CACHE_CLIENTS and importlib.util.find_spec(
+        CACHE_CLIENTS[CACHE_BACKEND]) is None:
+    # Клиент сервера не установлен: общий кэш на SQLite без сервера.
+    CACHE_BACKEND = 'sqlite'
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv(
+            'YATUBE_CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
     }
 }
 
@@ -115,6 +182,53 @@ PASSWORD_CHANGE_URL = 'users:password_reset'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 NUM_POST = 10
+# Комментариев на странице поста и в одной подгрузке «Показать ещё».
+NUM_COMMENTS = 20
+# С этой страницы кнопка «Следующая» переключает ленту на курсоры.
+CURSOR_AFTER_PAGE = 5
+# Кэш счётчиков постов (секунды) и порог, с которого общий счётчик
+# берётся из статистики планировщика вместо COUNT(*).
+POST_COUNT_TTL = 60 * 10
+POST_COUNT_ESTIMATE_FROM = 1_000_000
+# Период полураспада веса комментария в ленте «Горячее» (секунды).
+RANK_HALF_LIFE = 60 * 60 * 12
+# Материализованная лента подписок (см. posts.timeline).
+FOLLOW_TIMELINE = False
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 500
+TIMELINE_POPULAR_TTL = 60 * 10
+# Фрагменты лент инвалидируются версиями (posts.caching), TTL — страховка.
+FEED_CACHE_TTL = 60 * 60
+# Фоновые задачи (core.background): миниатюры и т.п.
+BACKGROUND_WORKERS = 2
+BACKGROUND_TASKS_SYNC = False
+# Задача модерации без новой пачки дольше этого (секунды) считается
+# брошенной, и manage.py resume_moderation запускает её заново.
+MODERATION_TASK_STALE = 60 * 10
+# Отложенная запись комментариев и подписок пачками (core.writebehind).
+WRITE_BEHIND = os.getenv('YATUBE_WRITE_BEHIND') == '1'
+# Каталог журналов; пустая строка — очередь только в памяти, и при
+# падении процесса теряются записи, ещё не попавшие в базу.
+WRITE_BEHIND_JOURNAL = os.getenv(
+    'YATUBE_WRITE_BEHIND_JOURNAL', os.path.join(BASE_DIR, 'journal'))
+# Размер сегмента журнала (байты): закрытый сегмент удаляется, когда
+# всё в нём применено.
+WRITE_BEHIND_SEGMENT_SIZE = 1 << 20
+# Сколько писатель собирает пачку и сколько запрос ждёт fsync журнала.
+WRITE_BEHIND_INTERVAL = 0.005
+WRITE_BEHIND_TIMEOUT = 5
+# Адаптивные варианты картинок (posts.variants); JPEG добавляется всегда.
+IMAGE_VARIANT_WIDTHS = (320, 640, 960)
+IMAGE_VARIANT_FORMATS = ('avif', 'webp')
+# Загрузки крупнее этого порога пишутся на диск кусками, а не в память.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+# Ограничения на загружаемые картинки (posts.uploads).
+IMAGE_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 50_000_000
+# PNG, WebP и GIF не умеют draft и декодируются целиком (до 4 байт на
+# пиксель), поэтому для них порог ниже: 12 Мп — около 48 МБ.
+IMAGE_UPLOAD_MAX_FULL_PIXELS = 12_000_000
+IMAGE_UPLOAD_MAX_SIDE = 2560
 # AUTH_USER_MODEL = 'users.User'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -11,6 +11,7 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('core/', include('core.urls', namespace='core')),
 ]
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.permission_denied'